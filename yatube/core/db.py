@@ -0,0 +1,154 @@
+"""
+Подключения к базе: настройка SQLite, проверка постоянных соединений
+и чтение с реплики.
+
+Представления, помеченные read_from_replica, читают через псевдоним
+DATABASE_REPLICA, если он настроен; запись всегда идет в default.
+После записи пользователь на DB_PIN_SECONDS закрепляется за основной
+базой (cookie DB_PIN_COOKIE), чтобы видеть свои изменения, даже
+пока реплика отстает.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_state = threading.local()
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    """Отмечает время проверки и применяет SQLITE_PRAGMAS к SQLite."""
+    # Только что открытое соединение проверять незачем.
+    connection.health_checked_at = time.monotonic()
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def check_health(connection, now=None):
+    """
+    Закрывает постоянное соединение, если оно больше не отвечает.
+
+    Проверяется только соединение, простоявшее дольше
+    DB_HEALTH_CHECK_INTERVAL: иначе каждый запрос платил бы лишний
+    круг до базы. Возвращает True, если соединение закрыто.
+    """
+    if connection.connection is None:
+        return False
+    now = time.monotonic() if now is None else now
+    checked = getattr(connection, 'health_checked_at', None)
+    connection.health_checked_at = now
+    interval = settings.DB_HEALTH_CHECK_INTERVAL
+    if checked is not None and now - checked < interval:
+        return False
+    if connection.is_usable():
+        return False
+    connection.close()
+    return True
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    for connection in connections.all():
+        if connection.settings_dict['CONN_MAX_AGE']:
+            check_health(connection)
+
+
+class RequestScope:
+    """Состояние маршрутизации в пределах одного HTTP-запроса."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+    @property
+    def primary_only(self):
+        return self.pinned or self.wrote
+
+
+@contextmanager
+def request_scope(pinned=False):
+    """Отслеживает запись в базу; pinned — читать только с основной."""
+    previous = getattr(_state, 'scope', None)
+    scope = _state.scope = RequestScope(pinned)
+    try:
+        yield scope
+    finally:
+        _state.scope = previous
+
+
+@contextmanager
+def use_replica():
+    """Чтение внутри блока идет с реплики, если она настроена."""
+    _state.depth = getattr(_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+
+
+def replica_alias():
+    """Псевдоним реплики, если чтение сейчас идет с нее, иначе None."""
+    replica = settings.DATABASE_REPLICA
+    if not replica or not getattr(_state, 'depth', 0):
+        return None
+    scope = getattr(_state, 'scope', None)
+    if scope is not None and scope.primary_only:
+        return None
+    return replica
+
+
+def read_from_replica(view):
+    """Декоратор представления, которое только читает данные."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def stream_from_replica(chunks):
+    """
+    Отдает куски потокового ответа, читая данные с реплики.
+
+    Потоковый ответ читает базу уже после выхода из представления,
+    за пределами read_from_replica.
+    """
+    with use_replica():
+        yield from chunks
+
+
+class ReplicaRouter:
+    """
+    Чтение в блоках use_replica — с реплики, остальное — с default.
+
+    Если в запросе уже была запись или пользователь закреплен
+    за основной базой, реплика не используется.
+    """
+
+    def db_for_read(self, model, **hints):
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        scope = getattr(_state, 'scope', None)
+        if scope is not None:
+            scope.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика хранит те же строки, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == settings.DATABASE_REPLICA:
+            return False
+        return None
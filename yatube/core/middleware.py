@@ -0,0 +1,159 @@
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import db
+from .templates import track_templates
+
+logger = logging.getLogger('yatube.queries')
+template_logger = logging.getLogger('yatube.templates')
+
+
+class QueryStats:
+    """Запросы к базе за время обработки одного HTTP-запроса."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        """
+        Запросы, повторенные с точностью до параметров, — признак N+1.
+
+        Пара одинаковых запросов обычно законна (например, счетчики
+        старой и новой группы), поэтому учитываются только повторы
+        не реже QUERY_DUPLICATE_THRESHOLD раз.
+        """
+        threshold = settings.QUERY_DUPLICATE_THRESHOLD
+        return {sql: times for sql, times in self.statements.items()
+                if times >= threshold}
+
+
+@contextmanager
+def track_queries():
+    """Собирает QueryStats по всем соединениям внутри блока with."""
+    stats = QueryStats()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        yield stats
+
+
+class QueryCountMiddleware:
+    """
+    Считает запросы к базе, их суммарное время и повторы по каждому URL.
+
+    Итог пишется в лог yatube.queries: на уровне INFO для всех
+    запросов и WARNING, если превышен QUERY_COUNT_WARNING
+    или есть повторяющиеся запросы.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with track_queries() as stats:
+            response = self.get_response(request)
+        self.report(request, response, stats)
+        return response
+
+    def report(self, request, response, stats):
+        match = request.resolver_match
+        url_name = match.view_name if match else request.path
+        duplicates = stats.duplicates
+        too_many = stats.count > settings.QUERY_COUNT_WARNING
+        level = logging.WARNING if too_many or duplicates else logging.INFO
+        logger.log(
+            level,
+            '%s %s: %d queries, %.1f ms, %d duplicated',
+            request.method, url_name, stats.count, stats.duration * 1000,
+            sum(duplicates.values()),
+            extra={'url_name': url_name,
+                   'queries': stats.count,
+                   'duplicates': duplicates}
+        )
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(stats.count)
+            response['X-Query-Time'] = f'{stats.duration * 1000:.1f}'
+
+
+class TemplateProfileMiddleware:
+    """
+    Время рендеринга шаблонов по каждому URL; включается TEMPLATE_PROFILE.
+
+    В лог yatube.templates пишется общее время и TEMPLATE_PROFILE_TOP
+    самых дорогих шаблонов по собственному времени, без вложенных.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TEMPLATE_PROFILE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with track_templates() as stats:
+            response = self.get_response(request)
+            # Отложенный ответ рендерится здесь, внутри замера.
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+        self.report(request, response, stats)
+        return response
+
+    def report(self, request, response, stats):
+        match = request.resolver_match
+        url_name = match.view_name if match else request.path
+        top = stats.top(settings.TEMPLATE_PROFILE_TOP)
+        template_logger.info(
+            '%s %s: templates %.1f ms; %s',
+            request.method, url_name, stats.duration * 1000,
+            ', '.join(f'{name} {timing.calls}x {timing.own * 1000:.1f} ms'
+                      for name, timing in top),
+            extra={'url_name': url_name,
+                   'templates': {name: {'calls': timing.calls,
+                                        'total': timing.total,
+                                        'own': timing.own}
+                                 for name, timing in top}}
+        )
+        if settings.DEBUG:
+            response['X-Template-Time'] = f'{stats.duration * 1000:.1f}'
+
+
+class ReadYourWritesMiddleware:
+    """
+    Закрепляет пользователя за основной базой после его записи.
+
+    Запрос, который что-то записал, ставит cookie на DB_PIN_SECONDS;
+    пока она есть, представления с read_from_replica читают с основной
+    базы, и пользователь сразу видит свои записи и комментарии.
+    Закрепленный запрос помечается request.db_pinned.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = settings.DB_PIN_COOKIE in request.COOKIES
+        request.db_pinned = pinned
+        with db.request_scope(pinned) as scope:
+            response = self.get_response(request)
+        if scope.wrote and settings.DATABASE_REPLICA:
+            response.set_cookie(settings.DB_PIN_COOKIE, '1',
+                                max_age=settings.DB_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
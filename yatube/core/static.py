@@ -0,0 +1,96 @@
+"""
+Раздача собранной статики WSGI-приложением без отдельного веб-сервера.
+
+Файлы читаются из STATIC_ROOT; из сжатых копий core.storage
+выбирается та, что клиент указал в Accept-Encoding. Имена с хэшем
+из манифеста кэшируются браузером на год без проверки, остальные —
+на STATIC_MAX_AGE секунд.
+"""
+import json
+import mimetypes
+import os
+import posixpath
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.utils.http import http_date, parse_http_date_safe
+
+# сжатые копии в порядке предпочтения
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме запрещенных через q=0."""
+    encodings = set()
+    for item in header.split(','):
+        name, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip() and quality > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+class StaticFilesApplication:
+    """WSGI-обертка: запросы к STATIC_URL отдает сама, прочие — Django."""
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = os.path.abspath(root or settings.STATIC_ROOT)
+        self.prefix = prefix or settings.STATIC_URL
+        self.immutable = self._hashed_names()
+
+    def _hashed_names(self):
+        manifest = os.path.join(self.root, 'staticfiles.json')
+        try:
+            with open(manifest, encoding='utf-8') as file:
+                return set(json.load(file)['paths'].values())
+        except (OSError, ValueError, KeyError):
+            return set()
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(self.prefix):
+            return self.application(environ, start_response)
+        name = posixpath.normpath(path[len(self.prefix):]).lstrip('/')
+        filename = os.path.join(self.root, *name.split('/'))
+        if (name.startswith('..') or not os.path.isfile(filename)
+                or environ['REQUEST_METHOD'] not in ('GET', 'HEAD')):
+            return self.application(environ, start_response)
+        return self.serve(environ, start_response, name, filename)
+
+    def serve(self, environ, start_response, name, filename):
+        content_type, _ = mimetypes.guess_type(name)
+        headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Vary', 'Accept-Encoding'),
+            ('Cache-Control', IMMUTABLE if name in self.immutable
+             else f'public, max-age={settings.STATIC_MAX_AGE}'),
+        ]
+        accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.isfile(filename + suffix):
+                filename += suffix
+                headers.append(('Content-Encoding', encoding))
+                break
+        stat = os.stat(filename)
+        headers.append(('Last-Modified', http_date(stat.st_mtime)))
+        since = parse_http_date_safe(
+            environ.get('HTTP_IF_MODIFIED_SINCE', '')
+        )
+        if since is not None and int(stat.st_mtime) <= since:
+            start_response('304 Not Modified', headers)
+            return []
+        headers.append(('Content-Length', str(stat.st_size)))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(filename, 'rb'))
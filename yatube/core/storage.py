@@ -0,0 +1,94 @@
+"""
+Хранилище статики: имена с хэшем содержимого, сжатые копии и
+минификация CSS при collectstatic.
+
+Рядом с каждым файлом из STATIC_COMPRESS_EXTENSIONS кладутся копии
+.gz и, если установлен пакет brotli, .br; core.static отдает ту,
+что поддерживает клиент.
+"""
+import gzip
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Строки CSS не минифицируются: в них пробелы и «/*» значимы.
+CSS_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+CSS_COMMENT = re.compile(CSS_STRING.pattern + r'|/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s+')
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(css):
+    """Убирает из CSS комментарии и лишние пробелы."""
+    css = CSS_COMMENT.sub(lambda match: match.group(1) or '', css)
+    parts = CSS_STRING.split(css)
+    for i in range(0, len(parts), 2):
+        code = CSS_SPACE.sub(' ', parts[i])
+        parts[i] = CSS_PUNCTUATION.sub(r'\1', code).replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def compress(content):
+    """Сжатые варианты содержимого: расширение — байты."""
+    variants = {'gz': gzip.compress(content, 9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content)
+    return variants
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage с минификацией CSS и сжатыми копиями.
+
+    Файлы без записи в манифесте (collectstatic еще не запускался,
+    как в тестах и при разработке) отдаются по исходному имени.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+        for path in paths:
+            if path.endswith('.css') and not path.endswith('.min.css'):
+                self._minify(path)
+        # Хэш считается по уже минифицированным копиям в STATIC_ROOT.
+        paths = {path: (self, path) for path in paths}
+        yield from super().post_process(paths, dry_run, **options)
+        for name in self.hashed_files.values():
+            self._compress(name)
+
+    def _minify(self, path):
+        with self.open(path) as original:
+            css = original.read().decode()
+        self.delete(path)
+        self._save(path, ContentFile(minify_css(css).encode()))
+
+    def _compress(self, name):
+        extensions = settings.STATIC_COMPRESS_EXTENSIONS
+        if not name.endswith(extensions) or not self.exists(name):
+            return
+        with self.open(name) as original:
+            content = original.read()
+        for extension, compressed in compress(content).items():
+            # Мелкие файлы сжатие может только увеличить.
+            if len(compressed) >= len(content):
+                continue
+            variant = f'{name}.{extension}'
+            if self.exists(variant):
+                self.delete(variant)
+            self._save(variant, ContentFile(compressed))
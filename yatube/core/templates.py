@@ -0,0 +1,95 @@
+"""
+Профилирование рендеринга шаблонов.
+
+track_templates() замеряет время каждого Template._render в потоке,
+где открыт блок: корневого шаблона, {% include %} (в том числе
+в циклах), inclusion-тегов и render_to_string. Для каждого шаблона
+считаются вызовы, полное время и собственное — без вложенных
+шаблонов, по нему видно, что на самом деле стоит дорого.
+Блоки шаблона с {% extends %} рендерятся внутри родителя и входят
+в его собственное время, как и ленивые запросы к базе из них.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.template.base import Template
+
+_state = threading.local()
+# Template._render до установки обертки; тестовое окружение Django
+# тоже подменяет его, поэтому запоминается при установке.
+_inner_render = Template._render
+
+
+class TemplateTiming:
+    __slots__ = ('calls', 'total', 'own')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.own = 0.0
+
+
+class TemplateStats:
+    """Время рендеринга шаблонов по именам."""
+
+    def __init__(self):
+        self.templates = {}
+        self._nested = []
+
+    def __call__(self, template, context):
+        name = template.origin.template_name or template.origin.name
+        self._nested.append(0.0)
+        started = time.perf_counter()
+        try:
+            return _inner_render(template, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            timing = self.templates.get(name)
+            if timing is None:
+                timing = self.templates[name] = TemplateTiming()
+            timing.calls += 1
+            timing.total += elapsed
+            timing.own += elapsed - nested
+
+    @property
+    def duration(self):
+        """Время шаблонов верхнего уровня, то есть всего рендеринга."""
+        return sum(timing.own for timing in self.templates.values())
+
+    def top(self, limit=None):
+        """Шаблоны по убыванию собственного времени."""
+        ordered = sorted(self.templates.items(),
+                         key=lambda item: item[1].own, reverse=True)
+        return ordered[:limit]
+
+
+def _render(template, context):
+    stats = getattr(_state, 'stats', None)
+    if stats is None:
+        return _inner_render(template, context)
+    return stats(template, context)
+
+
+def _install():
+    global _inner_render
+    if Template._render is not _render:
+        _inner_render = Template._render
+        Template._render = _render
+
+
+@contextmanager
+def track_templates():
+    """Собирает TemplateStats внутри блока with в текущем потоке."""
+    # Обертка ставится один раз; без открытого блока она лишь
+    # передает вызов дальше.
+    _install()
+    previous = getattr(_state, 'stats', None)
+    stats = _state.stats = TemplateStats()
+    try:
+        yield stats
+    finally:
+        _state.stats = previous
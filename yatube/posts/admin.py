@@ -1,13 +1,99 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+
+from utils.paginator import CachedCountPaginator
 from .models import Comment, Follow, Group, Post
 
 
-class PostAdmin(admin.ModelAdmin):
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """
+    Автокомплит, выбранный вариант которого передан в loaded.
+
+    В строке списка связанный объект уже загружен list_select_related,
+    и отдельный запрос за его названием на каждую строку не нужен.
+    """
+    loaded = ()
+
+    def optgroups(self, name, value, attr=None):
+        loaded = {str(obj.pk): obj for obj in self.loaded}
+        selected = [item for item in value
+                    if str(item) not in self.choices.field.empty_values]
+        if not loaded or any(str(item) not in loaded for item in selected):
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for item in selected:
+            obj = loaded[str(item)]
+            options.append(self.create_option(
+                name, obj.pk, self.choices.field.label_from_instance(obj),
+                True, len(options)
+            ))
+        return [(None, options, 0)]
+
+
+def shared_choices_form(form_class, autocomplete=()):
+    """
+    Форма строки list_editable, в которой варианты связанных полей
+    читаются один раз на страницу, а не отдельным запросом на строку.
+
+    Поля из autocomplete_fields остаются автокомплитом: выбранный
+    объект берется из строки.
+    """
+    choices = {}
+
+    class SharedChoicesForm(form_class):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            for name, field in self.fields.items():
+                if not isinstance(field, forms.ModelChoiceField):
+                    continue
+                if name in autocomplete:
+                    widget = getattr(field.widget, 'widget', field.widget)
+                    related = getattr(self.instance, name, None)
+                    widget.loaded = [related] if related else []
+                    continue
+                if name not in choices:
+                    choices[name] = list(field.choices)
+                field.widget = forms.Select(choices=choices[name])
+
+    return SharedChoicesForm
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Список для больших таблиц: без полного COUNT, с оценкой числа
+    строк и связанными объектами в том же запросе.
+    """
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs['widget'] = PreloadedAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        return shared_choices_form(
+            super().get_changelist_form(request, **kwargs),
+            self.get_autocomplete_fields(request)
+        )
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group', 'image')
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    # Переходы по годам и месяцам идут по индексу pub_date.
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author', 'group')
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -17,17 +103,20 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'post', 'text')
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('pk', 'post', 'author', 'created', 'text')
+    list_select_related = ('post', 'author')
     search_fields = ('text',)
-    list_filter = ('post',)
-    empty_value_display = '-пусто-'
+    # Индекса по created нет: порядок по ключу почти тот же и дешевле.
+    ordering = ('-pk',)
+    autocomplete_fields = ('post', 'author')
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('pk', 'author', 'user')
-    search_fields = ('author',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('author', 'user')
+    search_fields = ('author__username', 'user__username')
+    autocomplete_fields = ('author', 'user')
 
 
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,206 @@
+"""
+JSON API только для чтения: записи, группы и профили авторов.
+
+Строки выбираются через values() только с запрошенными полями
+(?fields=id,text,author.username; имя связи — все ее поля), без
+создания объектов моделей. Списки листаются курсором, как ленты
+на сайте: в ответе есть ссылки next и previous. ETag и 304 — те же,
+что у HTML-страниц (posts.conditional).
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+
+from core.db import read_from_replica
+from utils.paginator import DEFAULT_ORDERING, get_paginator
+from .conditional import (conditional_page, group_scopes, index_scopes,
+                          post_scopes, profile_scopes)
+from .models import Group, Post, User
+
+# Поля ответа и пути к ним в values(); точка — вложенный объект.
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'image': 'image',
+    'author.username': 'author__username',
+    'author.first_name': 'author__first_name',
+    'author.last_name': 'author__last_name',
+    'group.slug': 'group__slug',
+    'group.title': 'group__title',
+}
+GROUP_FIELDS = {
+    'id': 'id',
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+    'posts_count': 'posts_count',
+}
+PROFILE_FIELDS = {
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'posts_count': 'stats__posts_count',
+    'followers_count': 'stats__followers_count',
+    'following_count': 'stats__following_count',
+}
+# Вложенный объект пустой связи выводится как null.
+NULLABLE = {'group': 'group_id'}
+GROUPS_ORDERING = ('title', 'id')
+
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+class InvalidFields(Exception):
+    pass
+
+
+def parse_fields(request, available):
+    """Поля из ?fields в порядке available; по умолчанию — все."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(available)
+    requested = set()
+    for name in filter(None, (name.strip() for name in value.split(','))):
+        matched = [field for field in available
+                   if field == name or field.startswith(f'{name}.')]
+        if not matched:
+            raise InvalidFields(name)
+        requested.update(matched)
+    return [field for field in available if field in requested]
+
+
+def select(queryset, fields, available, keys=()):
+    """values() с путями полей, ключом паджинатора и флагами связей."""
+    paths = {available[field] for field in fields}
+    paths.update(keys)
+    paths.update(NULLABLE[field.split('.')[0]] for field in fields
+                 if field.split('.')[0] in NULLABLE)
+    return queryset.values(*sorted(paths))
+
+
+def project(row, fields, available):
+    """Строка values() в словарь ответа с вложенными объектами."""
+    item = {}
+    for field in fields:
+        value = row[available[field]]
+        if field == 'image':
+            value = default_storage.url(value) if value else None
+        name, _, attribute = field.partition('.')
+        if not attribute:
+            item[name] = value
+        elif name in NULLABLE and row[NULLABLE[name]] is None:
+            item[name] = None
+        else:
+            item.setdefault(name, {})[attribute] = value
+    return item
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        size = settings.API_PAGE_SIZE
+    return min(max(size, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop('page', None)
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status,
+                        json_dumps_params=JSON_PARAMS)
+
+
+def list_response(request, queryset, available, ordering):
+    try:
+        fields = parse_fields(request, available)
+    except InvalidFields as field:
+        return error(f'Неизвестное поле: {field}')
+    keys = [key.lstrip('-') for key in ordering]
+    rows = select(queryset, fields, available, keys)
+    page = get_paginator(request, rows, ordering,
+                         per_page=page_size(request))
+    paginator = page.paginator
+    return JsonResponse({
+        'results': [project(row, fields, available) for row in page],
+        'next': page_link(request, paginator.next_cursor),
+        'previous': page_link(request, paginator.previous_cursor),
+    }, json_dumps_params=JSON_PARAMS)
+
+
+def object_response(request, queryset, available):
+    try:
+        fields = parse_fields(request, available)
+    except InvalidFields as field:
+        return error(f'Неизвестное поле: {field}')
+    row = select(queryset, fields, available).first()
+    if row is None:
+        return error('Не найдено', status=404)
+    return JsonResponse(project(row, fields, available),
+                        json_dumps_params=JSON_PARAMS)
+
+
+@read_from_replica
+@conditional_page(index_scopes)
+def posts(request):
+    return list_response(request, Post.objects.all(), POST_FIELDS,
+                         DEFAULT_ORDERING)
+
+
+@read_from_replica
+@conditional_page(post_scopes)
+def post(request, post_id):
+    return object_response(request, Post.objects.filter(pk=post_id),
+                           POST_FIELDS)
+
+
+@read_from_replica
+@conditional_page(index_scopes)
+def groups(request):
+    return list_response(request, Group.objects.all(), GROUP_FIELDS,
+                         GROUPS_ORDERING)
+
+
+@read_from_replica
+@conditional_page(group_scopes)
+def group(request, slug):
+    return object_response(request, Group.objects.filter(slug=slug),
+                           GROUP_FIELDS)
+
+
+@read_from_replica
+@conditional_page(group_scopes)
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True
+    ).first()
+    if group_id is None:
+        return error('Не найдено', status=404)
+    return list_response(request, Post.objects.filter(group_id=group_id),
+                         POST_FIELDS, DEFAULT_ORDERING)
+
+
+@read_from_replica
+@conditional_page(profile_scopes)
+def profile(request, username):
+    return object_response(request, User.objects.filter(username=username),
+                           PROFILE_FIELDS)
+
+
+@read_from_replica
+@conditional_page(profile_scopes)
+def profile_posts(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True
+    ).first()
+    if author_id is None:
+        return error('Не найдено', status=404)
+    return list_response(request, Post.objects.filter(author_id=author_id),
+                         POST_FIELDS, DEFAULT_ORDERING)
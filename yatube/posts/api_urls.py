@@ -0,0 +1,16 @@
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', api.posts, name='posts'),
+    path('posts/<int:post_id>/', api.post, name='post'),
+    path('groups/', api.groups, name='groups'),
+    path('groups/<slug:slug>/', api.group, name='group'),
+    path('groups/<slug:slug>/posts/', api.group_posts, name='group_posts'),
+    path('profiles/<username>/', api.profile, name='profile'),
+    path('profiles/<username>/posts/',
+         api.profile_posts,
+         name='profile_posts'),
+]
@@ -0,0 +1,61 @@
+"""
+Кэш карточек постов, общий для всех лент.
+
+Карточка (posts/includes/post_list.html) одинакова на главной,
+в группе, профиле, подписках и поиске, поэтому хранится отдельно
+от страниц: после новой записи страница ленты собирается заново,
+но карточки остальных постов берутся из кэша одним get_many.
+
+В ключ входит отпечаток всего, что выводит карточка: текста, даты,
+картинки и имени автора. Правка поста, смена картинки или
+переименование автора дают новый ключ, а старая карточка истекает
+сама, так что инвалидировать ее сигналами не нужно.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import thumbnails
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+
+
+def card_key(post, show_author=True):
+    fields = [post.text, post.pub_date.isoformat(), post.image.name or '',
+              post.image_variants]
+    if show_author:
+        fields.append(post.author.get_full_name())
+    stamp = hashlib.md5('\0'.join(fields).encode()).hexdigest()
+    return f'post_card:{post.pk}:{int(show_author)}:{stamp}'
+
+
+def prefetch(posts, show_author=True):
+    """
+    Загружает карточки страницы одним запросом к кэшу.
+
+    Для постов без карточки в кэше заранее загружаются миниатюры.
+    """
+    posts = list(posts)
+    keys = {post.pk: card_key(post, show_author) for post in posts}
+    cards = cache.get_many(keys.values())
+    for post in posts:
+        post._card = cards.get(keys[post.pk])
+    thumbnails.prefetch([post for post in posts if post._card is None])
+
+
+def render(post, show_author=True):
+    """HTML карточки: из кэша или отрисованный и сохраненный в кэш."""
+    card = getattr(post, '_card', None)
+    if card is None:
+        card = render_to_string(CARD_TEMPLATE, {
+            'post': post,
+            'show_author': show_author,
+        })
+        # Заглушку вместо миниатюры запоминать нельзя.
+        if not thumbnails.is_pending(post):
+            cache.set(card_key(post, show_author), card,
+                      settings.POST_CARD_CACHE_TIMEOUT)
+    return mark_safe(card)
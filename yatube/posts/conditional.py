@@ -0,0 +1,124 @@
+"""
+Условные GET-запросы к страницам записей.
+
+ETag страницы строится из версий областей кэша (utils.cache), адреса,
+пользователя и его сессии, поэтому проверка не требует отрисовки шаблона: при
+совпадении с If-None-Match отдается 304 Not Modified. Версии меняются
+в сигналах при каждом изменении данных, которые выводит страница.
+
+Версии должны быть общими для всех воркеров, поэтому с кэшем в памяти
+процесса (CONDITIONAL_PAGES = False) страницы отдаются без ETag.
+Страница, прочитанная с реплики вскоре после изменения, могла
+не застать его, хотя версия уже новая: такой ответ тоже идет без
+ETag, пока не пройдет DB_PIN_SECONDS — то же допущение об отставании
+реплики, что и у закрепления за основной базой.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from core.db import replica_alias
+from utils.cache import get_version
+from .models import Group, Post, User
+
+
+def page_validators(request, scopes):
+    """ETag страницы с этими областями и время их последнего изменения."""
+    versions = get_version(*scopes)
+    key = f'{versions}:{request.user.pk}:{request.get_full_path()}'
+    if request.user.is_authenticated:
+        # Страница содержит CSRF-токен: после нового входа копия
+        # из браузера не годится, даже если данные не менялись.
+        key += (f':{request.session.session_key}'
+                f':{request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")}')
+    etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+    # Версия — время изменения в наносекундах.
+    changed = max(int(version) for version in versions.split('.')) / 10 ** 9
+    return etag, changed
+
+
+def replica_may_lag(changed):
+    """Страница прочитана с реплики, которая могла не застать изменение."""
+    return (replica_alias() is not None
+            and time.time() - changed < settings.DB_PIN_SECONDS)
+
+
+def set_validators(response, etag, last_modified):
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+
+
+def conditional_page(get_scopes):
+    """
+    Декоратор представления с ETag и Last-Modified.
+
+    get_scopes(request, *args, **kwargs) возвращает области кэша
+    страницы или None, если объекта нет — тогда ответ отдает само
+    представление.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (not settings.CONDITIONAL_PAGES
+                    or request.method not in ('GET', 'HEAD')):
+                return view(request, *args, **kwargs)
+            scopes = get_scopes(request, *args, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            etag, changed = page_validators(request, scopes)
+            # Страница авторизованного пользователя зависит не только
+            # от него, поэтому Last-Modified — лишь анонимным посетителям.
+            last_modified = None
+            if not request.user.is_authenticated:
+                last_modified = int(changed)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if replica_may_lag(changed):
+                    etag = last_modified = None
+            if response.status_code in (200, 304):
+                set_validators(response, etag, last_modified)
+                # Без no-cache браузер мог бы показывать копию
+                # без проверки, пока не истечет эвристический срок.
+                patch_cache_control(response, no_cache=True,
+                                    private=request.user.is_authenticated)
+            return response
+        return wrapper
+    return decorator
+
+
+def index_scopes(request):
+    return ('index',)
+
+
+def group_scopes(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True
+    ).first()
+    return None if group_id is None else (f'group:{group_id}',)
+
+
+def profile_scopes(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return (f'author:{author_id}', f'follows:{author_id}')
+
+
+def post_scopes(request, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return (f'author:{author_id}', f'post:{post_id}')
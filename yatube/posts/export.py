@@ -0,0 +1,154 @@
+"""
+Потоковая выгрузка записей и комментариев автора или группы.
+
+Строки читаются через values().iterator(chunk_size=EXPORT_CHUNK_SIZE)
+и сразу превращаются в байты, поэтому память не зависит от числа
+записей: ни выборка, ни файл целиком в ней не лежат. Форматы:
+NDJSON и CSV (записи, затем комментарии, поле type различает их)
+и zip с posts.ndjson и исходными картинками, который тоже пишется
+кусками по мере чтения.
+"""
+import csv
+import time
+import zipfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment
+
+CSV_COLUMNS = ('type', 'id', 'post_id', 'author', 'group', 'date', 'text',
+               'image')
+# Столько байт копится перед отправкой клиенту.
+BUFFER_SIZE = 64 * 1024
+
+
+def post_rows(posts):
+    """Записи выборки по одной, в порядке ленты автора или группы."""
+    rows = posts.order_by('-pub_date', '-id').values(
+        'id', 'author__username', 'group__slug', 'pub_date', 'text', 'image'
+    )
+    for row in rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'post',
+            'id': row['id'],
+            'author': row['author__username'],
+            'group': row['group__slug'],
+            'date': row['pub_date'],
+            'text': row['text'],
+            'image': row['image'] or None,
+        }
+
+
+def comment_rows(posts):
+    """Комментарии к записям выборки."""
+    # Без сортировки: план идет по индексам записей и комментариев
+    # к ним и не собирает всю выборку ради ORDER BY.
+    rows = Comment.objects.filter(post__in=posts.values('id')).order_by(
+    ).values('id', 'post_id', 'author__username', 'created', 'text')
+    for row in rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'comment',
+            'id': row['id'],
+            'post_id': row['post_id'],
+            'author': row['author__username'],
+            'date': row['created'],
+            'text': row['text'],
+        }
+
+
+def rows(posts):
+    yield from post_rows(posts)
+    yield from comment_rows(posts)
+
+
+def buffered(chunks):
+    """Склеивает мелкие куски в блоки около BUFFER_SIZE байт."""
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def ndjson(posts):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return buffered(f'{encoder.encode(row)}\n'.encode()
+                    for row in rows(posts))
+
+
+class _Line:
+    """Файл для csv.writer, который возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def csv_export(posts):
+    writer = csv.writer(_Line())
+
+    def lines():
+        yield writer.writerow(CSV_COLUMNS)
+        for row in rows(posts):
+            yield writer.writerow([row.get(column, '')
+                                   for column in CSV_COLUMNS])
+
+    return buffered(line.encode() for line in lines())
+
+
+class _ZipStream:
+    """Поток без seek для zipfile: записанное забирается через drain()."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Отдает записанное с прошлого раза, если оно есть."""
+        if self.parts:
+            yield b''.join(self.parts)
+            self.parts = []
+
+
+def zip_export(posts):
+    """Архив: posts.ndjson и картинки в images/ без повторного сжатия."""
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('posts.ndjson', 'w', force_zip64=True) as entry:
+            for chunk in ndjson(posts):
+                entry.write(chunk)
+                yield from stream.drain()
+        images = posts.exclude(image='').values_list('image', flat=True)
+        for name in images.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            if not default_storage.exists(name):
+                continue
+            info = zipfile.ZipInfo(f'images/{name}',
+                                   time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with default_storage.open(name) as image, \
+                    archive.open(info, 'w', force_zip64=True) as entry:
+                for chunk in image.chunks(BUFFER_SIZE):
+                    entry.write(chunk)
+                    yield from stream.drain()
+    yield from stream.drain()
+
+
+# формат: функция выгрузки, тип содержимого, расширение файла
+FORMATS = {
+    'ndjson': (ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (csv_export, 'text/csv; charset=utf-8', 'csv'),
+    'zip': (zip_export, 'application/zip', 'zip'),
+}
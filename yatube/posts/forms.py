@@ -1,5 +1,6 @@
 from django import forms
 from .models import Post, Comment
+from .uploads import check_image
 
 
 class PostForm(forms.ModelForm):
@@ -7,6 +8,30 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        image = self.files.get('image')
+        self.upload_error = getattr(image, 'upload_error', None)
+        if self.upload_error:
+            # Файл не дописан обработчиком загрузки: не разбираем его.
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.upload_error:
+            self.add_error('image', self.upload_error)
+        return cleaned_data
+
+    def clean_image(self):
+        data = self.cleaned_data['image']
+        image = getattr(data, 'image', None)
+        if image is not None:
+            error = check_image(image)
+            if error:
+                raise forms.ValidationError(error)
+        return data
+
     def clean_text(self):
         data = self.cleaned_data['text']
         if not data:
@@ -0,0 +1,205 @@
+import json
+import math
+import statistics
+import subprocess
+import time
+from contextlib import nullcontext
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.middleware import track_queries
+from core.templates import track_templates
+from utils.explain import explain, sorts
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+ROUTES = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+          'authors_info', 'groups_info')
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, rank):
+    """Процентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)), 1) - 1]
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку и число запросов основных страниц '
+            'на данных текущей базы и выводит отчет в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('routes', nargs='*',
+                            help=f'Страницы из {", ".join(ROUTES)}; '
+                                 f'по умолчанию все')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Число замеров каждой страницы')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Число прогревочных запросов без замера')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом')
+        parser.add_argument('--explain', action='store_true',
+                            help='Добавить в отчет планы запросов страниц')
+        parser.add_argument('--templates', action='store_true',
+                            help='Добавить в отчет время рендеринга '
+                                 'шаблонов страниц')
+        parser.add_argument('--label', help='Метка отчета')
+        parser.add_argument('--output', help='Файл отчета вместо stdout')
+        parser.add_argument('--compare',
+                            help='Отчет прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        routes = options['routes'] or ROUTES
+        unknown = set(routes) - set(ROUTES)
+        if unknown:
+            raise CommandError(f'Неизвестные страницы: {", ".join(unknown)}')
+        if options['requests'] < 1:
+            raise CommandError('--requests должно быть больше нуля')
+        targets = self.targets()
+        results = {}
+        # Без DEBUG: панель отладки и заголовки не искажают замер.
+        with override_settings(DEBUG=False):
+            for name in routes:
+                client, url = targets[name]
+                results[name] = self.measure(client, url, options)
+        report = {
+            'label': options['label'],
+            'commit': current_commit(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'data': {
+                'users': User.objects.count(),
+                'groups': Group.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'options': {key: options[key]
+                        for key in ('requests', 'warmup', 'cold', 'explain',
+                                    'templates')},
+            'routes': results,
+        }
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(data)
+        else:
+            self.stdout.write(data)
+        if options['compare']:
+            self.compare(options['compare'], report)
+
+    def targets(self):
+        """Самые тяжелые экземпляры каждой страницы."""
+        group = Group.objects.order_by('-posts_count').first()
+        author = (UserStats.objects.select_related('user')
+                  .order_by('-posts_count').first())
+        reader = (UserStats.objects.select_related('user')
+                  .order_by('-following_count').first())
+        post = (Post.objects.annotate(comments_total=Count('comments'))
+                .order_by('-comments_total').first())
+        if None in (group, author, reader, post):
+            raise CommandError('Нет данных: запустите generate_data')
+        anonymous = Client()
+        authorized = Client()
+        authorized.force_login(reader.user)
+        return {
+            'index': (anonymous, reverse('posts:index')),
+            'group_posts': (anonymous, reverse('posts:group_list',
+                                               args=(group.slug,))),
+            'profile': (anonymous, reverse('posts:profile',
+                                           args=(author.user.username,))),
+            'post_detail': (anonymous, reverse('posts:post_detail',
+                                               args=(post.pk,))),
+            'follow_index': (authorized, reverse('posts:follow_index')),
+            'authors_info': (anonymous, reverse('posts:authors_info')),
+            'groups_info': (anonymous, reverse('posts:groups_info')),
+        }
+
+    def measure(self, client, url, options):
+        for _ in range(options['warmup']):
+            client.get(url)
+        timings = []
+        queries = []
+        status = None
+        profile = (track_templates() if options['templates']
+                   else nullcontext())
+        with profile as templates:
+            for _ in range(options['requests']):
+                if options['cold']:
+                    cache.clear()
+                with track_queries() as stats:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(stats.count)
+                status = response.status_code
+        result = {'url': url, 'status': status}
+        for rank in PERCENTILES:
+            result[f'p{rank}_ms'] = round(percentile(timings, rank), 2)
+        result.update({
+            'mean_ms': round(statistics.mean(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries_median': statistics.median(queries),
+            'queries_max': max(queries),
+        })
+        if options['explain']:
+            result['plans'] = self.plans(client, url)
+        if templates is not None:
+            result['templates'] = self.templates(templates,
+                                                 options['requests'])
+        return result
+
+    def templates(self, stats, requests):
+        """Шаблоны страницы в среднем на запрос, дорогие первыми."""
+        return [
+            {'name': name,
+             'calls': round(timing.calls / requests, 2),
+             'own_ms': round(timing.own * 1000 / requests, 3),
+             'total_ms': round(timing.total * 1000 / requests, 3)}
+            for name, timing in stats.top()
+        ]
+
+    def plans(self, client, url):
+        """Планы выборок страницы; sorted — строки сортируются."""
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        plans = []
+        for query in queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            plan = explain(query['sql'])
+            plans.append({'sql': query['sql'], 'plan': plan,
+                          'sorted': bool(sorts(plan))})
+        return plans
+
+    def compare(self, path, report):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)['routes']
+        self.stderr.write(f'{"страница":<14}{"p50 мс":>18}{"p95 мс":>18}'
+                          f'{"запросов":>12}')
+        for name, result in report['routes'].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            self.stderr.write(
+                f'{name:<14}'
+                f'{before["p50_ms"]:>8} → {result["p50_ms"]:<7}'
+                f'{before["p95_ms"]:>8} → {result["p95_ms"]:<7}'
+                f'{before["queries_max"]:>5} → {result["queries_max"]:<4}'
+            )
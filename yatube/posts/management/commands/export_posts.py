@@ -0,0 +1,49 @@
+import codecs
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import FORMATS
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = ('Выгружает записи и комментарии автора или группы '
+            'в NDJSON, CSV или zip с картинками')
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--author', help='Имя пользователя автора')
+        source.add_argument('--group', help='Slug группы')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson',
+                            help='Формат выгрузки')
+        parser.add_argument('--output',
+                            help='Файл выгрузки вместо stdout; для zip '
+                                 'обязателен')
+
+    def handle(self, *args, **options):
+        if not options['author'] and not options['group']:
+            raise CommandError('Укажите --author или --group')
+        if options['format'] == 'zip' and not options['output']:
+            raise CommandError('Для zip нужен --output')
+        export = FORMATS[options['format']][0]
+        chunks = export(self.posts(options))
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            return
+        # Граница куска может прийтись на середину символа.
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in chunks:
+            self.stdout.write(decoder.decode(chunk), ending='')
+
+    def posts(self, options):
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(f'Нет автора {options["author"]}')
+            return author.posts.all()
+        group = Group.objects.filter(slug=options['group']).first()
+        if group is None:
+            raise CommandError(f'Нет группы {options["group"]}')
+        return group.posts.all()
@@ -0,0 +1,184 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from posts import stats
+from posts.models import Comment, Follow, Group, Post, User
+
+# Объемы при --scale 1.
+BASE_SIZES = {
+    'users': 1000,
+    'groups': 20,
+    'posts': 20000,
+    'comments': 50000,
+}
+TEXTS_POOL = 500
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет задать даты полей auto_now_add при bulk_create."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными: пользователи, группы, '
+            'посты, комментарии и подписки со степенным распределением')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Множитель объемов: 1 — 20 000 постов')
+        for name, size in BASE_SIZES.items():
+            parser.add_argument(f'--{name}', type=int,
+                                help=f'Число записей, по умолчанию '
+                                     f'{size} * scale')
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Показатель степенного закона популярности')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить публикации')
+        parser.add_argument('--batch-size', type=int,
+                            help='Размер пачки INSERT, по умолчанию '
+                                 'наибольший допустимый для базы')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        sizes = {
+            name: options[name] if options[name] is not None
+            else max(1, round(size * options['scale']))
+            for name, size in BASE_SIZES.items()
+        }
+        if sizes['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.period = timedelta(days=options['days']).total_seconds()
+
+        with transaction.atomic():
+            users = self.create_users(sizes['users'])
+            groups = self.create_groups(sizes['groups'])
+            # Популярность авторов: вес k-го по рангу ~ 1 / k ** zipf.
+            authors = users[:]
+            self.random.shuffle(authors)
+            weights = list(accumulate(
+                1 / rank ** options['zipf']
+                for rank in range(1, len(authors) + 1)
+            ))
+            posts = self.create_posts(sizes['posts'], authors, weights,
+                                      groups)
+            self.create_comments(sizes['comments'], users, posts)
+            follows = self.create_follows(users, authors, weights,
+                                          options['follows'])
+            stats.recount_users()
+            stats.recount_groups()
+        call_command('rebuild_timelines', stdout=self.stdout)
+        # bulk_create обходит сигналы, которые ведут поисковый индекс.
+        call_command('rebuild_search_index', stdout=self.stdout)
+        with connection.cursor() as cursor:
+            # Статистика планировщика нужна для оценки числа строк.
+            cursor.execute('ANALYZE')
+        cache.clear()
+        self.stdout.write(
+            f'Создано пользователей: {len(users)}, групп: {len(groups)}, '
+            f'постов: {len(posts)}, комментариев: {sizes["comments"]}, '
+            f'подписок: {follows}'
+        )
+
+    def random_date(self, after=None):
+        start = after or self.now - timedelta(seconds=self.period)
+        span = (self.now - start).total_seconds()
+        return start + timedelta(seconds=self.random.uniform(0, span))
+
+    def texts(self, sentences):
+        return [self.fake.paragraph(nb_sentences=sentences)
+                for _ in range(TEXTS_POOL)]
+
+    def create_users(self, size):
+        start = (User.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        password = make_password(None)
+        User.objects.bulk_create(
+            (User(username=f'user_{start + i}',
+                  first_name=self.fake.first_name(),
+                  last_name=self.fake.last_name(),
+                  password=password)
+             for i in range(size)),
+            batch_size=self.batch_size
+        )
+        return list(User.objects.filter(pk__gte=start)
+                    .values_list('pk', flat=True))
+
+    def create_groups(self, size):
+        start = (Group.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        Group.objects.bulk_create(
+            (Group(title=self.fake.catch_phrase()[:200],
+                   slug=f'group-{start + i}',
+                   description=self.fake.paragraph())
+             for i in range(size)),
+            batch_size=self.batch_size
+        )
+        return list(Group.objects.filter(pk__gte=start)
+                    .values_list('pk', flat=True))
+
+    def create_posts(self, size, authors, weights, groups):
+        texts = self.texts(5)
+        start = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            Post.objects.bulk_create(
+                (Post(text=self.random.choice(texts),
+                      author_id=self.random.choices(authors,
+                                                    cum_weights=weights)[0],
+                      group_id=(self.random.choice(groups)
+                                if self.random.random() < 0.7 else None),
+                      pub_date=self.random_date())
+                 for _ in range(size)),
+                batch_size=self.batch_size
+            )
+        return list(Post.objects.filter(pk__gte=start)
+                    .values_list('pk', 'pub_date'))
+
+    def create_comments(self, size, users, posts):
+        texts = self.texts(2)
+        with explicit_dates(Comment._meta.get_field('created')):
+            Comment.objects.bulk_create(
+                (Comment(text=self.random.choice(texts),
+                         author_id=self.random.choice(users),
+                         post_id=post_id,
+                         created=self.random_date(after=pub_date))
+                 for post_id, pub_date in (self.random.choice(posts)
+                                           for _ in range(size))),
+                batch_size=self.batch_size
+            )
+
+    def create_follows(self, users, authors, weights, average):
+        follows = []
+        for user_id in users:
+            wanted = min(len(authors) - 1,
+                         round(self.random.expovariate(1 / average)))
+            chosen = set(self.random.choices(authors, cum_weights=weights,
+                                             k=wanted))
+            chosen.discard(user_id)
+            follows.extend(Follow(user_id=user_id, author_id=author_id)
+                           for author_id in chosen)
+        Follow.objects.bulk_create(follows, batch_size=self.batch_size,
+                                   ignore_conflicts=True)
+        return len(follows)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс записей и комментариев'
+
+    def handle(self, *args, **options):
+        total = search.get_backend().rebuild()
+        self.stdout.write(f'Проиндексировано записей: {total}')
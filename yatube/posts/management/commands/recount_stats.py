@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов и подписок, исправляя расхождения'
+
+    def handle(self, *args, **options):
+        users = stats.recount_users()
+        groups = stats.recount_groups()
+        self.stdout.write(
+            f'Исправлено счетчиков пользователей: {users}, групп: {groups}'
+        )
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Создает недостающие миниатюры картинок постов параллельно '
+            'и записывает их варианты')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Число потоков')
+
+    def handle(self, *args, **options):
+        names = (Post.objects.exclude(image='').order_by()
+                 .values_list('image', flat=True).distinct().iterator())
+        processed = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            # Потоки только пишут файлы, kvstore заполняется здесь же.
+            for name, created in executor.map(
+                lambda name: (name, thumbnails.create_files(name)), names
+            ):
+                processed += 1
+                if created:
+                    thumbnails.register(name)
+                    thumbnails.set_state(name, thumbnails.READY)
+                    Post.objects.filter(image=name, image_variants='').update(
+                        image_variants=thumbnails.describe(name)
+                    )
+                else:
+                    failed += 1
+        self.stdout.write(
+            f'Обработано картинок: {processed}, с ошибками: {failed}'
+        )
@@ -0,0 +1,87 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import posts.models
+
+from utils.stemmer import stems
+
+CREATE_INDEX = '''
+    CREATE VIRTUAL TABLE posts_search USING fts5(
+        text, comments, tokenize = 'unicode61 remove_diacritics 0'
+    )
+'''
+# Вес совпадения в тексте записи и в комментариях для bm25.
+CONFIGURE_RANK = '''
+    INSERT INTO posts_search(posts_search, rank)
+    VALUES ('rank', 'bm25(10.0, 1.0)')
+'''
+# Записей на пачку: комментарии выбираются по пачке, а не все сразу.
+BATCH_SIZE = 500
+
+
+def document(text):
+    return ' '.join(stems(text))
+
+
+def create_index(apps, schema_editor):
+    # Виртуальные таблицы FTS5 есть только в SQLite; для других баз
+    # настраивается бэкенд поиска без индекса.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_INDEX)
+    schema_editor.execute(CONFIGURE_RANK)
+    Post = apps.get_model('posts', 'Post')
+    batch = []
+    for row in Post.objects.order_by('id').values_list('id',
+                                                        'text').iterator():
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            insert(apps, batch)
+            batch = []
+    insert(apps, batch)
+
+
+def insert(apps, posts):
+    """Строки индекса пачки записей вместе с их комментариями."""
+    Comment = apps.get_model('posts', 'Comment')
+    PostSearch = apps.get_model('posts', 'PostSearch')
+    comments = {post_id: [] for post_id, _ in posts}
+    for post_id, text in Comment.objects.filter(
+            post_id__in=comments).order_by('id').values_list('post_id',
+                                                             'text'):
+        comments[post_id].append(document(text))
+    PostSearch.objects.bulk_create(
+        PostSearch(post_id=post_id,
+                   text=document(text),
+                   comments=' '.join(comments[post_id]))
+        for post_id, text in posts
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearch',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('text', posts.models.FullTextField(verbose_name='Основы слов текста')),
+                ('comments', posts.models.FullTextField(verbose_name='Основы слов комментариев')),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс записи',
+                'verbose_name_plural': 'Поисковый индекс записей',
+                'db_table': 'posts_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
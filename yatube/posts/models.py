@@ -1,5 +1,9 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Lookup
+
+from .uploads import upload_error
 
 User = get_user_model()
 
@@ -8,6 +12,11 @@ class Group(models.Model):
     title = models.CharField('Имя группы', max_length=200)
     slug = models.SlugField('URL', unique=True)
     description = models.TextField('Описание')
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self) -> str:
         return self.title
@@ -28,12 +37,14 @@ class Post(models.Model):
         on_delete=models.CASCADE,
         related_name='posts',
         verbose_name='Автор',
+        db_index=False,
     )
     group = models.ForeignKey(
         Group,
         blank=True,
         null=True,
         on_delete=models.SET_NULL,
+        db_index=False,
         related_name='posts',
         verbose_name='Группа',
         help_text='Выберите группу для своей записи',
@@ -44,13 +55,45 @@ class Post(models.Model):
         blank=True,
         help_text='Выберите картинку для своей записи'
     )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='JSON: имя, формат и размеры каждой миниатюры'
+    )
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты группы и автора идут по этим индексам в порядке
+        # паджинатора (-pub_date, -id) без сортировки; они же заменяют
+        # одиночные индексы внешних ключей.
+        indexes = [
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.text[:15]} ...'
 
+    def clean(self):
+        # Обработчик загрузки общий: файл, который он отверг,
+        # могут прислать и формы без проверки upload_error.
+        error = upload_error(self.image)
+        if error:
+            raise ValidationError({'image': error})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем группу, картинку и текст из базы,
+        # чтобы сигналы видели их смену.
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        instance._loaded_image = str(instance.__dict__.get('image') or '')
+        instance._loaded_text = instance.__dict__.get('text')
+        return instance
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -58,6 +101,7 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name='comments',
         verbose_name='Пост',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -76,6 +120,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        # Комментарии записи в порядке COMMENTS_ORDERING.
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.text[:15]} ...'
@@ -86,13 +135,15 @@ class Follow(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='follower',
-        verbose_name='Подписчик'
+        verbose_name='Подписчик',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='following',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False,
     )
 
     class Meta:
@@ -101,3 +152,108 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_users')
         ]
+        # Подписки пользователя ищутся по уникальному (user, author),
+        # подписчики автора — по этому индексу без обращения к таблице.
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    # Копия Post.pub_date: лента сортируется и листается по индексу
+    # записей без соединения с постами.
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Количество постов',
+                                              default=0)
+    followers_count = models.PositiveIntegerField('Количество подписчиков',
+                                                  default=0)
+    following_count = models.PositiveIntegerField('Количество подписок',
+                                                  default=0)
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self) -> str:
+        return f'{self.user}'
+
+
+class FullTextField(models.TextField):
+    """Колонка полнотекстового индекса с поиском через __match."""
+
+
+@FullTextField.register_lookup
+class Match(Lookup):
+    """
+    Условие MATCH по всем колонкам индекса FTS5.
+
+    Слева стоит скрытая колонка с именем таблицы: только так SQLite
+    ищет по индексу, а не сравнивает строки.
+    """
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        quote = compiler.quote_name_unless_alias
+        table = self.lhs.target.model._meta.db_table
+        rhs, params = self.process_rhs(compiler, connection)
+        return f'{quote(self.lhs.alias)}.{quote(table)} MATCH {rhs}', params
+
+
+class PostSearch(models.Model):
+    """
+    Поисковый индекс записи: основы слов текста и комментариев.
+
+    Таблица виртуальная (FTS5) и создается миграцией, строка
+    связана с записью через rowid.
+    """
+    post = models.OneToOneField(
+        Post,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name='search',
+        verbose_name='Пост'
+    )
+    text = FullTextField('Основы слов текста')
+    comments = FullTextField('Основы слов комментариев')
+
+    class Meta:
+        managed = False
+        db_table = 'posts_search'
+        verbose_name = 'Поисковый индекс записи'
+        verbose_name_plural = 'Поисковый индекс записей'
@@ -0,0 +1,227 @@
+"""
+Полнотекстовый поиск по записям и комментариям к ним.
+
+Тексты приводятся к основам слов русским стеммером, поэтому запрос
+«котами» находит «кот» и «кота». Бэкенд выбирается настройкой
+SEARCH_BACKEND, а без нее — по СУБД: SQLiteFTSBackend ведет индекс
+FTS5 и ранжирует по bm25, базовый SearchBackend ищет подстроки
+без индекса и ничего не записывает.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Concat
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from utils.paginator import DEFAULT_ORDERING
+from utils.stemmer import stems
+from .models import Comment, Post, PostSearch
+
+logger = logging.getLogger('yatube.search')
+
+# Бэкенды по СУБД, если SEARCH_BACKEND не задан.
+VENDOR_BACKENDS = {'sqlite': 'posts.search.SQLiteFTSBackend'}
+FALLBACK_BACKEND = 'posts.search.SearchBackend'
+
+_backend = None
+_stale = threading.local()
+
+
+def terms(query):
+    """Различные основы слов запроса, не больше SEARCH_MAX_TERMS."""
+    unique = list(dict.fromkeys(stems(query)))
+    return unique[:settings.SEARCH_MAX_TERMS]
+
+
+def document(text):
+    """Текст для индекса: основы слов через пробел."""
+    return ' '.join(stems(text))
+
+
+class SearchBackend:
+    """
+    Поиск подстрок основ в тексте записи и комментариях.
+
+    Индекса нет, поэтому каждый запрос просматривает таблицы;
+    годится для небольших баз и СУБД без FTS5.
+    """
+
+    @classmethod
+    def available(cls):
+        """Можно ли пользоваться бэкендом с текущей базой."""
+        return True
+
+    def search(self, queryset, query):
+        """Отобранные записи и порядок для паджинатора."""
+        found = terms(query)
+        if not found:
+            return queryset.none(), DEFAULT_ORDERING
+        for term in found:
+            queryset = queryset.filter(
+                Q(text__icontains=term) | Q(comments__text__icontains=term)
+            )
+        return queryset.distinct(), DEFAULT_ORDERING
+
+    def add_post(self, post):
+        pass
+
+    def update_post(self, post):
+        pass
+
+    def add_comment(self, comment):
+        pass
+
+    def update_comments(self, post_ids):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def rebuild(self):
+        """Заново строит индекс; возвращает число записей в нем."""
+        return 0
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    Индекс FTS5 в таблице posts_search, по строке на запись.
+
+    Основы текста и комментариев лежат в разных колонках: вес
+    совпадения в тексте задается в миграции (bm25 с весами 10 и 1).
+    Результаты упорядочены по релевантности, при равенстве — новые
+    выше; курсор паджинатора хранит пару (rank, id).
+    """
+    ordering = ('rank', '-id')
+
+    @classmethod
+    def available(cls):
+        # Таблицу создает миграция 0021, и только в SQLite.
+        return (connection.vendor == 'sqlite'
+                and PostSearch._meta.db_table
+                in connection.introspection.table_names())
+
+    def search(self, queryset, query):
+        found = terms(query)
+        if not found:
+            return queryset.none(), DEFAULT_ORDERING
+        expression = ' '.join(f'"{term}"' for term in found)
+        table = PostSearch._meta.db_table
+        queryset = queryset.filter(search__text__match=expression).annotate(
+            rank=RawSQL(f'"{table}"."rank"', (), output_field=FloatField())
+        )
+        return queryset, self.ordering
+
+    def add_post(self, post):
+        PostSearch.objects.create(post_id=post.pk,
+                                  text=document(post.text),
+                                  comments='')
+
+    def update_post(self, post):
+        PostSearch.objects.filter(pk=post.pk).update(
+            text=document(post.text)
+        )
+
+    def add_comment(self, comment):
+        # Новый комментарий дописывается без чтения остальных.
+        PostSearch.objects.filter(pk=comment.post_id).update(
+            comments=Concat('comments', Value(f' {document(comment.text)}'))
+        )
+
+    def update_comments(self, post_ids):
+        texts = {post_id: [] for post_id in post_ids}
+        for post_id, text in Comment.objects.filter(
+                post_id__in=post_ids).order_by('id').values_list('post_id',
+                                                                 'text'):
+            texts[post_id].append(document(text))
+        for post_id, documents in texts.items():
+            PostSearch.objects.filter(pk=post_id).update(
+                comments=' '.join(documents)
+            )
+
+    def remove_post(self, post_id):
+        PostSearch.objects.filter(pk=post_id).delete()
+
+    def rebuild(self):
+        PostSearch.objects.all().delete()
+        total = 0
+        posts = Post.objects.order_by('id').values_list('id', 'text')
+        batch = []
+        for row in posts.iterator():
+            batch.append(row)
+            if len(batch) == settings.SEARCH_REBUILD_BATCH_SIZE:
+                total += self._insert(batch)
+                batch = []
+        return total + self._insert(batch)
+
+    def _insert(self, posts):
+        comments = {post_id: [] for post_id, _ in posts}
+        for post_id, text in Comment.objects.filter(
+                post_id__in=comments).order_by('id').values_list('post_id',
+                                                                 'text'):
+            comments[post_id].append(document(text))
+        PostSearch.objects.bulk_create(
+            PostSearch(post_id=post_id,
+                       text=document(text),
+                       comments=' '.join(comments[post_id]))
+            for post_id, text in posts
+        )
+        return len(posts)
+
+
+def get_backend():
+    """
+    Бэкенд из SEARCH_BACKEND или по СУБД основной базы.
+
+    Если индекса для бэкенда нет, используется поиск без индекса:
+    сигналы не должны писать в отсутствующую таблицу.
+    """
+    global _backend
+    if _backend is None:
+        path = settings.SEARCH_BACKEND or VENDOR_BACKENDS.get(
+            connection.vendor, FALLBACK_BACKEND
+        )
+        backend_class = import_string(path)
+        if not backend_class.available():
+            logger.warning('Бэкенд поиска %s недоступен для базы %s, '
+                           'используется %s', path, connection.vendor,
+                           FALLBACK_BACKEND)
+            backend_class = import_string(FALLBACK_BACKEND)
+        _backend = backend_class()
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    global _backend
+    if setting == 'SEARCH_BACKEND':
+        _backend = None
+
+
+def search_posts(queryset, query):
+    return get_backend().search(queryset, query)
+
+
+def update_comments_on_commit(post_id):
+    """
+    Переиндексирует комментарии записи после фиксации транзакции.
+
+    При каскадном удалении записи сигнал приходит на каждый
+    комментарий: записи копятся в наборе и обрабатываются разом.
+    """
+    stale = getattr(_stale, 'posts', None)
+    if stale is None:
+        stale = _stale.posts = set()
+    stale.add(post_id)
+    transaction.on_commit(_update_stale)
+
+
+def _update_stale():
+    post_ids = _stale.__dict__.pop('posts', None)
+    if post_ids:
+        get_backend().update_comments(post_ids)
@@ -0,0 +1,237 @@
+from django.core.exceptions import ValidationError
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from utils.cache import bump_version
+from utils.counting import adjust_count, count_key
+from . import search, stats, thumbnails, timeline, uploads
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+# Поля пользователя, которые выводят страницы записей.
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def post_list_scopes(post, *group_ids):
+    """Области кэша списков записей, в которые входит запись."""
+    scopes = {'index', f'author:{post.author_id}'}
+    scopes.update(f'group:{group_id}' for group_id in group_ids if group_id)
+    return scopes
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    loaded_group_id = getattr(instance, '_loaded_group_id',
+                              instance.group_id)
+    bump_version(*post_list_scopes(instance, instance.group_id,
+                                   loaded_group_id))
+    if created:
+        adjust_count(count_key('posts'), 1)
+        stats.change_user_stats(instance.author_id, posts_count=1)
+        if instance.group_id:
+            stats.change_group_posts(instance.group_id, 1)
+    elif loaded_group_id != instance.group_id:
+        if loaded_group_id:
+            stats.change_group_posts(loaded_group_id, -1)
+        if instance.group_id:
+            stats.change_group_posts(instance.group_id, 1)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    bump_version(*post_list_scopes(instance, instance.group_id))
+    adjust_count(count_key('posts'), -1)
+    stats.change_user_stats(instance.author_id, posts_count=-1)
+    if instance.group_id:
+        stats.change_group_posts(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.change_user_stats(instance.author_id, followers_count=1)
+        stats.change_user_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.change_user_stats(instance.author_id, followers_count=-1)
+    stats.change_user_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        adjust_count(count_key('users'), 1)
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=User)
+def check_user_name(sender, instance, update_fields=None, **kwargs):
+    # Вход меняет только last_login: страницы от этого не устаревают.
+    instance._name_changed = False
+    if instance.pk is None or (
+            update_fields is not None
+            and set(USER_NAME_FIELDS).isdisjoint(update_fields)):
+        return
+    loaded = User.objects.filter(pk=instance.pk).values_list(
+        *USER_NAME_FIELDS
+    ).first()
+    current = tuple(getattr(instance, name) for name in USER_NAME_FIELDS)
+    instance._name_changed = loaded is not None and loaded != current
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, **kwargs):
+    # Имя автора выводится в карточках его записей во всех списках
+    # и в его комментариях на страницах чужих записей.
+    if not getattr(instance, '_name_changed', False):
+        return
+    groups = instance.posts.exclude(group=None).order_by().values_list(
+        'group_id', flat=True
+    ).distinct()
+    commented = instance.comments.order_by().values_list(
+        'post_id', flat=True
+    ).distinct()
+    bump_version('index', f'author:{instance.id}',
+                 *(f'group:{group_id}' for group_id in groups),
+                 *(f'post:{post_id}' for post_id in commented))
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    adjust_count(count_key('users'), -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    # Ссылки на группу есть на главной и в профилях ее авторов.
+    authors = instance.posts.order_by().values_list(
+        'author_id', flat=True
+    ).distinct()
+    bump_version('index', f'group:{instance.id}',
+                 *(f'author:{author_id}' for author_id in authors))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_page(sender, instance, **kwargs):
+    bump_version(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_lists(sender, instance, **kwargs):
+    # Подписчики и подписки выводятся в профилях обоих пользователей.
+    bump_version(f'follows:{instance.author_id}',
+                 f'follows:{instance.user_id}')
+
+
+@receiver(pre_save, sender=Post)
+def prepare_image(sender, instance, **kwargs):
+    image = instance.image
+    error = uploads.upload_error(image)
+    if error:
+        # Недописанный обработчиком файл в хранилище не попадает.
+        raise ValidationError({'image': error})
+    if image and not image._committed:
+        # Оригинал раздается из MEDIA_URL сразу после записи,
+        # поэтому метаданные убираются до нее; пиксели не декодируются.
+        uploads.strip_metadata(image.file)
+        # Имя в хранилище известно только после записи файла, которую
+        # FileField.pre_save сделал бы позже в том же save().
+        image.save(image.name, image.file, save=False)
+    name = image.name if image else ''
+    if name != getattr(instance, '_loaded_image', ''):
+        # Прежние варианты нужны, чтобы удалить их файлы.
+        instance._replaced_variants = instance.image_variants
+        # Варианты уходят в базу тем же INSERT или UPDATE.
+        instance.image_variants = thumbnails.describe(name) if name else ''
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, created, update_fields=None,
+                        **kwargs):
+    name = instance.image.name if instance.image else ''
+    loaded = getattr(instance, '_loaded_image', '')
+    if name != loaded:
+        if update_fields is not None and 'image_variants' not in update_fields:
+            Post.objects.filter(pk=instance.pk).update(
+                image_variants=instance.image_variants
+            )
+        # Файл виден воркерам только после фиксации транзакции, а списки
+        # с заглушкой вместо миниатюр устаревают, когда те готовы.
+        if name:
+            scopes = post_list_scopes(instance, instance.group_id)
+            transaction.on_commit(
+                lambda: thumbnails.schedule(name, scopes)
+            )
+        if loaded:
+            variants = getattr(instance, '_replaced_variants', '')
+            transaction.on_commit(
+                lambda: thumbnails.forget(loaded, variants)
+            )
+    instance._loaded_image = name
+
+
+@receiver(post_delete, sender=Post)
+def forget_thumbnails(sender, instance, **kwargs):
+    if instance.image:
+        name = instance.image.name
+        variants = instance.image_variants
+        transaction.on_commit(lambda: thumbnails.forget(name, variants))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, created, **kwargs):
+    if created:
+        search.get_backend().add_post(instance)
+    elif ('text' in instance.__dict__
+          and instance.text != getattr(instance, '_loaded_text', None)):
+        search.get_backend().update_post(instance)
+    instance._loaded_text = instance.__dict__.get('text')
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, created, **kwargs):
+    if created:
+        search.get_backend().add_comment(instance)
+    else:
+        search.update_comments_on_commit(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.update_comments_on_commit(instance.post_id)
+
+
+@receiver(request_finished)
+def wait_thumbnails(sender, **kwargs):
+    thumbnails.wait_scheduled()
@@ -0,0 +1,83 @@
+"""
+Денормализованные счетчики постов и подписок.
+
+Счетчики меняются атомарным UPDATE ... SET n = n + delta из сигналов
+сохранения и удаления Post/Follow, а recount пересчитывает их
+по данным и исправляет расхождения.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Follow, Group, Post, User, UserStats
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _count_subquery(model, field, outer='pk'):
+    counts = (model.objects.filter(**{field: OuterRef(outer)})
+              .order_by().values(field).annotate(total=Count('pk'))
+              .values('total'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def change_user_stats(user_id, **deltas):
+    """
+    Прибавляет deltas к счетчикам пользователя.
+
+    Отсутствующая строка счетчиков не создается: при каскадном удалении
+    пользователя она могла уже исчезнуть, расхождения исправляет recount.
+    """
+    UserStats.objects.filter(user_id=user_id).update(**{
+        name: F(name) + delta for name, delta in deltas.items()
+    })
+
+
+def change_group_posts(group_id, delta):
+    Group.objects.filter(pk=group_id).update(
+        posts_count=F('posts_count') + delta
+    )
+
+
+def recount_users(users=None):
+    """Пересчитывает счетчики пользователей, возвращает число исправлений."""
+    users = User.objects.all() if users is None else users
+    missing = users.filter(stats__isnull=True).values_list('pk', flat=True)
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id) for user_id in missing.iterator()),
+        batch_size=1000
+    )
+    stats = UserStats.objects.filter(user__in=users.values('pk'))
+    actual = {
+        f'actual_{name}': _count_subquery(model, field, 'user_id')
+        for name, (model, field) in USER_COUNTERS.items()
+    }
+    drift = stats.annotate(**actual).exclude(
+        posts_count=F('actual_posts_count'),
+        followers_count=F('actual_followers_count'),
+        following_count=F('actual_following_count'),
+    )
+    fixed = drift.count()
+    if fixed:
+        stats.filter(pk__in=drift.values('pk')).update(**{
+            name: _count_subquery(model, field, 'user_id')
+            for name, (model, field) in USER_COUNTERS.items()
+        })
+    return fixed
+
+
+def recount_groups(groups=None):
+    """Пересчитывает счетчики групп, возвращает число исправлений."""
+    groups = Group.objects.all() if groups is None else groups
+    drift = groups.annotate(
+        actual_posts_count=_count_subquery(Post, 'group')
+    ).exclude(posts_count=F('actual_posts_count'))
+    fixed = drift.count()
+    if fixed:
+        Group.objects.filter(pk__in=drift.values('pk')).update(
+            posts_count=_count_subquery(Post, 'group')
+        )
+    return fixed
@@ -0,0 +1,21 @@
+from django import template
+
+from posts import cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_cards(posts, author=True):
+    """
+    Загружает карточки страницы постов одним запросом к кэшу;
+    author=False — карточки без автора, как в профиле.
+    """
+    cards.prefetch(posts, author)
+    return ''
+
+
+@register.simple_tag
+def post_card(post, author=True):
+    """Карточка поста из posts/includes/post_list.html."""
+    return cards.render(post, author)
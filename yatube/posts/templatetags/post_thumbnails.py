@@ -0,0 +1,21 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """
+    Загружает миниатюры страницы постов одним запросом к индексу,
+    чтобы каждый {% thumbnail %} в цикле брал их из памяти.
+    """
+    thumbnails.prefetch(posts)
+    return ''
+
+
+@register.inclusion_tag('posts/includes/post_picture.html')
+def post_picture(post):
+    """Картинка поста: <picture> с вариантами по ширине и формату."""
+    return {'post': post, 'picture': thumbnails.picture(post)}
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTests(TestCase):
+    """Число запросов списков админки не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'group-{i}',
+                                 description='Описание')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(AdminChangelistTests.admin)
+
+    def add_rows(self, size):
+        for i in range(size):
+            author = User.objects.create_user(
+                username=f'user_{User.objects.count()}'
+            )
+            post = Post.objects.create(
+                text=f'Текст {i}', author=author,
+                group=AdminChangelistTests.groups[i % 3]
+            )
+            Comment.objects.create(post=post, author=author,
+                                   text=f'Комментарий {i}')
+            Follow.objects.create(user=author,
+                                  author=AdminChangelistTests.admin)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries(self):
+        """Проверка, что связанные объекты не читаются построчно."""
+        urls = [reverse(f'admin:posts_{model}_changelist')
+                for model in ('post', 'comment', 'follow')]
+        self.add_rows(2)
+        small = [self.count_queries(url) for url in urls]
+        self.add_rows(20)
+        large = [self.count_queries(url) for url in urls]
+        for url, before, after in zip(urls, small, large):
+            with self.subTest(url=url):
+                self.assertEqual(before, after)
+
+    def test_no_full_count(self):
+        """Проверка, что список не считает все строки таблицы."""
+        self.add_rows(2)
+        url = reverse('admin:posts_post_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'q': 'Текст 1'})
+        counts = [query['sql'] for query in queries
+                  if 'COUNT(' in query['sql'] and 'posts_post' in query['sql']]
+        self.assertEqual(len(counts), 1)
+        self.assertIn('LIKE', counts[0])
+
+    def test_autocomplete_widgets(self):
+        """Проверка, что связанные поля формы не выводят всю таблицу."""
+        self.add_rows(2)
+        post = Post.objects.first()
+        response = self.client.get(
+            reverse('admin:posts_post_change', args=(post.pk,))
+        )
+        content = response.content.decode()
+        self.assertIn('admin-autocomplete', content)
+        self.assertNotIn('user_1</option>', content)
+
+    def test_list_editable_autocomplete(self):
+        """Проверка, что группа в строке списка остается автокомплитом."""
+        self.add_rows(2)
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        content = response.content.decode()
+        self.assertIn('name="form-0-group"', content)
+        self.assertIn('admin-autocomplete', content)
+        for post in Post.objects.select_related('group'):
+            with self.subTest(post=post.pk):
+                self.assertIn(
+                    f'<option value="{post.group.pk}" selected>'
+                    f'{post.group.title}</option>', content
+                )
+        self.assertEqual(content.count('Группа 2</option>'), 0)
@@ -0,0 +1,128 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(API_PAGE_SIZE=2)
+class ApiTests(TestCase):
+    """JSON API записей, групп и профилей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author',
+                                              first_name='Лев',
+                                              last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        cls.posts = [
+            Post.objects.create(text=f'Текст поста {i}', author=cls.author,
+                                group=cls.group if i % 2 else None)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, name, *args, **params):
+        response = self.client.get(reverse(f'api:{name}', args=args),
+                                   params)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response, response.json()
+
+    def test_posts_pages(self):
+        """Проверка ленты: вложенные автор и группа, курсор next."""
+        response, data = self.get('posts')
+        self.assertEqual(response.status_code, 200)
+        post = ApiTests.posts[-1]
+        self.assertEqual(data['results'][0], {
+            'id': post.id,
+            'text': post.text,
+            'pub_date': data['results'][0]['pub_date'],
+            'image': None,
+            'author': {'username': 'author', 'first_name': 'Лев',
+                       'last_name': 'Толстой'},
+            'group': None,
+        })
+        self.assertEqual(data['results'][1]['group'],
+                         {'slug': 'test-slug', 'title': 'Тестовая группа'})
+        self.assertIsNone(data['previous'])
+
+        ids = []
+        url = reverse('api:posts')
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(item['id'] for item in data['results'])
+            url = data['next']
+        self.assertEqual(ids, [post.id for post in reversed(ApiTests.posts)])
+
+    def test_sparse_fields(self):
+        """Проверка выбора полей и выборки только нужных столбцов."""
+        with CaptureQueriesContext(connection) as queries:
+            _, data = self.get('posts', fields='id,author.username')
+        self.assertEqual(data['results'][0],
+                         {'id': ApiTests.posts[-1].id,
+                          'author': {'username': 'author'}})
+        sql = queries[-1]['sql']
+        self.assertNotIn('"text"', sql)
+        self.assertNotIn('posts_group', sql)
+
+        _, data = self.get('posts', fields='group')
+        self.assertEqual(set(data['results'][1]['group']), {'slug', 'title'})
+
+        response, data = self.get('posts', fields='id,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', data['error'])
+
+    def test_filtered_lists(self):
+        """Проверка записей группы и автора."""
+        _, data = self.get('group_posts', 'test-slug', limit=10)
+        self.assertEqual(len(data['results']), 2)
+        _, data = self.get('profile_posts', 'reader')
+        self.assertEqual(data['results'], [])
+        response, _ = self.get('group_posts', 'missing')
+        self.assertEqual(response.status_code, 404)
+
+    def test_objects(self):
+        """Проверка записи, группы и профиля."""
+        post = ApiTests.posts[1]
+        _, data = self.get('post', post.id, fields='id,text')
+        self.assertEqual(data, {'id': post.id, 'text': post.text})
+        _, data = self.get('group', 'test-slug')
+        self.assertEqual(data['posts_count'], 2)
+        _, data = self.get('groups')
+        self.assertEqual([group['slug'] for group in data['results']],
+                         ['test-slug'])
+        _, data = self.get('profile', 'author')
+        self.assertEqual(data, {
+            'username': 'author', 'first_name': 'Лев',
+            'last_name': 'Толстой', 'posts_count': 5,
+            'followers_count': 1, 'following_count': 0,
+        })
+        for name, arg in (('post', 0), ('profile', 'missing'),
+                          ('group', 'missing')):
+            with self.subTest(name=name):
+                response, _ = self.get(name, arg)
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(CONDITIONAL_PAGES=True)
+    def test_not_modified(self):
+        """Проверка ETag и ответа 304 до изменения данных."""
+        url = reverse('api:posts')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый пост', author=ApiTests.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
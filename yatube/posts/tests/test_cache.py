@@ -0,0 +1,84 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from utils.cache import get_or_compute
+from utils.sqlite_cache import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self.directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_shared_between_instances(self):
+        """Проверка, что запись видна через другое подключение к файлу."""
+        self.cache.set('key', {'value': 1})
+        other = SQLiteCache(self.location, {})
+        self.assertEqual(other.get('key'), {'value': 1})
+
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_incr_and_expiry(self):
+        """Проверка add, incr и истечения срока записи."""
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+        self.cache.set('short', 'value', 1)
+        self.assertEqual(self.cache.get_many(['short', 'counter']),
+                         {'short': 'value', 'counter': 3})
+        with mock.patch('time.time', return_value=time.time() + 2):
+            self.assertIsNone(self.cache.get('short'))
+            self.assertTrue(self.cache.add('short', 'new'))
+
+
+class GetOrComputeTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_computes_once(self):
+        """Проверка, что значение считается один раз до истечения."""
+        compute = mock.Mock(return_value='fragment')
+        for _ in range(3):
+            self.assertEqual(get_or_compute('key', compute, 60, beta=0),
+                             'fragment')
+        compute.assert_called_once()
+
+    def test_stale_value_while_locked(self):
+        """Проверка, что при занятой блокировке отдается прежнее значение."""
+        cache.set('key', ('old', time.time() + 60, 1.0))
+        cache.add('lock:key', True)
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(get_or_compute('key', compute, 60, beta=1e9),
+                         'old')
+        compute.assert_not_called()
+
+    def test_early_recompute(self):
+        """Проверка досрочного пересчета при большом beta."""
+        cache.set('key', ('old', time.time() + 60, 1.0))
+        self.assertEqual(get_or_compute('key', lambda: 'new', 60, beta=1e9),
+                         'new')
+
+    def test_refresh(self):
+        """Проверка, что refresh пересчитывает, не трогая блокировку."""
+        cache.set('key', ('old', time.time() + 60, 1.0))
+        cache.add('lock:key', True)
+        self.assertEqual(get_or_compute('key', lambda: 'new', 60,
+                                        refresh=True), 'new')
+        self.assertEqual(get_or_compute('key', lambda: 'other', 60,
+                                        beta=0), 'new')
+        self.assertTrue(cache.get('lock:key'))
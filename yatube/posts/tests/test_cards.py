@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Follow, Post
+
+User = get_user_model()
+
+
+class PostCardCacheTests(TestCase):
+    """Карточки постов кэшируются и переиспользуются лентами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author',
+                                              first_name='Лев',
+                                              last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [Post.objects.create(text=f'Текст поста {i}',
+                                         author=cls.author)
+                     for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(PostCardCacheTests.reader)
+
+    def render_feed(self, url=None):
+        """Рендерит ленту; возвращает ответ и число отрисованных карточек."""
+        url = url or reverse('posts:follow_index')
+        with mock.patch('posts.cards.render_to_string',
+                        wraps=render_to_string) as render:
+            response = self.client.get(url)
+        return response, render.call_count
+
+    def test_cards_reused(self):
+        """Проверка, что карточки берутся из кэша одним get_many."""
+        _, rendered = self.render_feed()
+        self.assertEqual(rendered, 3)
+        with mock.patch.object(cache, 'get_many',
+                               wraps=cache.get_many) as get_many:
+            _, rendered = self.render_feed()
+        self.assertEqual(rendered, 0)
+        card_calls = [call for call in get_many.call_args_list
+                      if any(str(key).startswith('post_card:')
+                             for key in call.args[0])]
+        self.assertEqual(len(card_calls), 1)
+
+    def test_card_changes(self):
+        """Проверка, что правка поста и имени автора меняют карточку."""
+        self.render_feed()
+        post = PostCardCacheTests.posts[0]
+        post.text = 'Новый текст'
+        post.save()
+        response, rendered = self.render_feed()
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Новый текст')
+
+        author = PostCardCacheTests.author
+        author.first_name = 'Федор'
+        author.save()
+        response, rendered = self.render_feed()
+        self.assertEqual(rendered, 3)
+        self.assertContains(response, 'Федор Толстой')
+
+    def test_profile_without_author(self):
+        """Проверка, что в профиле карточки без автора."""
+        profile = reverse('posts:profile',
+                          args=(PostCardCacheTests.author.username,))
+        response, _ = self.render_feed(profile)
+        self.assertNotContains(response, 'Автор:')
+        response, _ = self.render_feed()
+        self.assertContains(response, 'Автор: Лев Толстой')
+
+    def test_pending_not_cached(self):
+        """Проверка, что карточка с заглушкой миниатюры не сохраняется."""
+        with mock.patch('posts.thumbnails.is_pending', return_value=True):
+            self.render_feed()
+        _, rendered = self.render_feed()
+        self.assertEqual(rendered, 3)
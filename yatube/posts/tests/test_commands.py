@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from .. import stats
+from ..models import (Comment, Follow, Group, Post, PostSearch,
+                      TimelineEntry, User)
+
+
+class GenerateDataTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('generate_data', users=30, groups=3, posts=200,
+                     comments=300, follows=5, stdout=StringIO())
+
+    def test_sizes(self):
+        """Проверка объемов сгенерированных данных."""
+        sizes = (
+            (User, 30),
+            (Group, 3),
+            (Post, 200),
+            (Comment, 300),
+        )
+        for model, size in sizes:
+            with self.subTest(model=model.__name__):
+                self.assertEqual(model.objects.count(), size)
+
+    def test_consistency(self):
+        """Проверка счетчиков, лент, индекса и отсутствия подписок на себя."""
+        self.assertEqual(stats.recount_users(), 0)
+        self.assertEqual(stats.recount_groups(), 0)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(PostSearch.objects.count(), 200)
+
+    def test_dates_spread(self):
+        """Проверка, что публикации распределены по времени."""
+        self.assertGreater(Post.objects.values('pub_date').distinct()
+                           .count(), 1)
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__pub_date')
+        ).exists())
+
+    def test_benchmark_report(self):
+        """Проверка отчета benchmark по всем страницам."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            call_command('benchmark', requests=2, warmup=0, output=path,
+                         stdout=StringIO())
+            with open(path) as report_file:
+                report = json.load(report_file)
+        self.assertEqual(report['data']['posts'], 200)
+        for name, result in report['routes'].items():
+            with self.subTest(route=name):
+                self.assertEqual(result['status'], 200)
+                self.assertLessEqual(result['p50_ms'], result['max_ms'])
+
+    def test_benchmark_plans(self):
+        """Проверка планов в отчете: ленты читаются без сортировки."""
+        routes = ('group_posts', 'profile', 'post_detail')
+        out = StringIO()
+        call_command('benchmark', *routes, requests=1, warmup=0,
+                     explain=True, stdout=out)
+        report = json.loads(out.getvalue())
+        for name in routes:
+            plans = report['routes'][name]['plans']
+            with self.subTest(route=name):
+                self.assertTrue(plans)
+                self.assertFalse([plan for plan in plans if plan['sorted']])
+
+    def test_benchmark_templates(self):
+        """Проверка времени шаблонов в отчете."""
+        out = StringIO()
+        call_command('benchmark', 'index', requests=2, warmup=0, cold=True,
+                     templates=True, stdout=out)
+        templates = json.loads(out.getvalue())['routes']['index']['templates']
+        names = [template['name'] for template in templates]
+        self.assertIn('posts/index.html', names)
+        self.assertIn('posts/includes/post_list.html', names)
+        own = [template['own_ms'] for template in templates]
+        self.assertEqual(own, sorted(own, reverse=True))
@@ -0,0 +1,182 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(CONDITIONAL_PAGES=True)
+class ConditionalGetTests(TestCase):
+    """Страницы записей отвечают 304, пока их данные не менялись."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        cls.post = Post.objects.create(text='Тестовый пост',
+                                       author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(ConditionalGetTests.reader)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list',
+                    args=(ConditionalGetTests.group.slug,)),
+            reverse('posts:profile',
+                    args=(ConditionalGetTests.author.username,)),
+            reverse('posts:post_detail', args=(ConditionalGetTests.post.id,)),
+        )
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified(self):
+        """Проверка ответа 304 на повторный запрос без изменений."""
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.revalidate(self.client, url)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_not_modified_queries(self):
+        """Проверка, что для ответа 304 хватает одного запроса к базе."""
+        for url in self.urls():
+            etag = self.client.get(url)['ETag']
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertLessEqual(len(queries), 1)
+
+    def test_last_modified(self):
+        """Проверка Last-Modified для анонимного посетителя."""
+        url = reverse('posts:index')
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url,
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        response = self.reader_client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_modified_after_changes(self):
+        """Проверка, что изменения данных меняют ETag страниц."""
+        author = ConditionalGetTests.author
+        post = ConditionalGetTests.post
+        changes = (
+            lambda: Post.objects.create(text='Новый пост', author=author,
+                                        group=ConditionalGetTests.group),
+            lambda: Comment.objects.create(post=post, author=author,
+                                           text='Комментарий'),
+            lambda: Follow.objects.create(user=ConditionalGetTests.reader,
+                                          author=author),
+        )
+        pages = (
+            (self.urls()[:3], 'пост'),
+            (self.urls()[3:], 'комментарий'),
+            (self.urls()[2:3], 'подписка'),
+        )
+        for change, (urls, name) in zip(changes, pages):
+            etags = {url: self.client.get(url)['ETag'] for url in urls}
+            change()
+            for url in urls:
+                with self.subTest(change=name, url=url):
+                    response = self.client.get(url,
+                                               HTTP_IF_NONE_MATCH=etags[url])
+                    self.assertEqual(response.status_code, 200)
+
+    def test_modified_after_rename(self):
+        """Проверка, что смена имени автора меняет ETag его страниц."""
+        reader = ConditionalGetTests.reader
+        Comment.objects.create(post=ConditionalGetTests.post, author=reader,
+                               text='Комментарий')
+        changes = (
+            (ConditionalGetTests.author, self.urls()),
+            (reader, self.urls()[3:]),
+        )
+        for user, urls in changes:
+            etags = {url: self.client.get(url)['ETag'] for url in urls}
+            user.first_name = f'Новое имя {user.username}'
+            user.save()
+            for url in urls:
+                with self.subTest(user=user.username, url=url):
+                    response = self.client.get(url,
+                                               HTTP_IF_NONE_MATCH=etags[url])
+                    self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_after_login(self):
+        """Проверка, что обновление last_login не меняет страницы."""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        self.reader_client.force_login(ConditionalGetTests.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_depends_on_session(self):
+        """Проверка, что после нового входа страница отдается заново."""
+        url = reverse('posts:index')
+        etag = self.reader_client.get(url)['ETag']
+        self.reader_client.logout()
+        self.reader_client.force_login(ConditionalGetTests.reader)
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_depends_on_user_and_address(self):
+        """Проверка, что ETag зависит от пользователя и адреса."""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, {'page': 2},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertNotEqual(response.status_code, 304)
+
+    @override_settings(CONDITIONAL_PAGES=False)
+    def test_disabled_without_shared_cache(self):
+        """Проверка, что без общего кэша страницы идут без ETag."""
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+
+    @override_settings(DATABASE_REPLICA='default')
+    def test_replica_after_change(self):
+        """Проверка, что страница с реплики сразу после изменения без ETag."""
+        url = reverse('posts:index')
+        Post.objects.create(text='Новый пост',
+                            author=ConditionalGetTests.author)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        with override_settings(DB_PIN_SECONDS=0):
+            self.assertIn('ETag', self.client.get(url))
+
+    def test_missing_object(self):
+        """Проверка, что для несуществующего объекта отдается 404."""
+        for url in (reverse('posts:group_list', args=('missing',)),
+                    reverse('posts:profile', args=('missing',)),
+                    reverse('posts:post_detail', args=(0,))):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,134 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import db
+from core.middleware import ReadYourWritesMiddleware
+from ..models import Post
+from ..views import index
+
+
+class SQLiteConnectionTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(directory.name, 'db.sqlite3'),
+        }, alias='temporary')
+        self.addCleanup(self.wrapper.close)
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Проверка настроек SQLite нового соединения."""
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        # 1 — NORMAL
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+
+    @override_settings(DB_HEALTH_CHECK_INTERVAL=30)
+    def test_health_check(self):
+        """Проверка, что неотвечающее соединение закрывается."""
+        self.wrapper.ensure_connection()
+        checked = self.wrapper.health_checked_at
+        with mock.patch.object(self.wrapper, 'is_usable',
+                               return_value=False) as is_usable:
+            self.assertFalse(db.check_health(self.wrapper, checked + 10))
+            is_usable.assert_not_called()
+            self.assertTrue(db.check_health(self.wrapper, checked + 60))
+        self.assertIsNone(self.wrapper.connection)
+        self.assertFalse(db.check_health(self.wrapper))
+
+
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = db.ReplicaRouter()
+
+    @override_settings(DATABASE_REPLICA='replica')
+    def test_reads_in_block(self):
+        """Проверка, что с реплики читается только внутри use_replica."""
+        self.assertIsNone(self.router.db_for_read(Post))
+        with db.use_replica():
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+            self.assertIsNone(self.router.db_for_write(Post))
+        self.assertIsNone(self.router.db_for_read(Post))
+        self.assertIs(self.router.allow_migrate('replica', 'posts'), False)
+
+    @override_settings(DATABASE_REPLICA=None)
+    def test_without_replica(self):
+        """Проверка, что без реплики чтение идет с основной базы."""
+        with db.use_replica():
+            self.assertIsNone(self.router.db_for_read(Post))
+
+    @override_settings(DATABASE_REPLICA='replica')
+    def test_view_marked(self):
+        """Проверка, что лента главной страницы читается с реплики."""
+        aliases = []
+
+        def render(request, template, context):
+            aliases.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        with mock.patch('posts.views.render', render), \
+                mock.patch('posts.views.get_paginator'), \
+                mock.patch('posts.views.get_version'):
+            request = RequestFactory().get('/')
+            request.user = AnonymousUser()
+            index(request)
+        self.assertEqual(aliases, ['replica'])
+
+
+@override_settings(DATABASE_REPLICA='replica')
+class ReadYourWritesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = db.ReplicaRouter()
+        self.reads = []
+
+    def view(self, write=False):
+        def get_response(request):
+            with db.use_replica():
+                self.reads.append(self.router.db_for_read(Post))
+                if write:
+                    self.router.db_for_write(Post)
+                    self.reads.append(self.router.db_for_read(Post))
+            return HttpResponse()
+        return ReadYourWritesMiddleware(get_response)
+
+    def test_write_pins_user(self):
+        """Проверка, что после записи чтение идет с основной базы."""
+        response = self.view(write=True)(RequestFactory().post('/'))
+        self.assertEqual(self.reads, ['replica', None])
+        cookie = response.cookies[settings.DB_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.DB_PIN_SECONDS)
+
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.DB_PIN_COOKIE] = '1'
+        response = self.view()(request)
+        self.assertEqual(self.reads[-1], None)
+        self.assertNotIn(settings.DB_PIN_COOKIE, response.cookies)
+
+    def test_reads_without_writes(self):
+        """Проверка, что чтение без записи не закрепляет пользователя."""
+        response = self.view()(RequestFactory().get('/'))
+        self.assertEqual(self.reads, ['replica'])
+        self.assertNotIn(settings.DB_PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICA=None)
+    def test_no_cookie_without_replica(self):
+        """Проверка, что без реплики cookie не ставится."""
+        response = self.view(write=True)(RequestFactory().post('/'))
+        self.assertNotIn(settings.DB_PIN_COOKIE, response.cookies)
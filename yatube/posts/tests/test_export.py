@@ -0,0 +1,185 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import export
+from ..models import Comment, Group, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_THUMBNAIL_INDEX = os.path.join(TEMP_MEDIA_ROOT, 'thumbnails.sqlite3')
+
+User = get_user_model()
+
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   THUMBNAIL_INDEX=TEMP_THUMBNAIL_INDEX,
+                   EXPORT_CHUNK_SIZE=2)
+class ExportTests(TestCase):
+    """Потоковая выгрузка записей и комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.admin = User.objects.create_user(username='admin',
+                                             is_staff=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+        cls.posts = [
+            Post.objects.create(text=f'Текст, "пост" {i}', author=cls.author,
+                                group=cls.group if i % 2 else None)
+            for i in range(5)
+        ]
+        cls.image_post = Post.objects.create(
+            text='Пост с картинкой', author=cls.author,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF,
+                                     content_type='image/gif')
+        )
+        Comment.objects.create(post=cls.posts[0], author=cls.reader,
+                               text='Комментарий')
+        Post.objects.create(text='Чужой пост', author=cls.reader)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(ExportTests.author)
+
+    def download(self, client, url, export_format):
+        response = client.get(url, {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def profile_url(self):
+        return reverse('posts:profile_export',
+                       args=(ExportTests.author.username,))
+
+    def test_ndjson(self):
+        """Проверка записей и комментариев автора в NDJSON."""
+        response, content = self.download(self.author_client,
+                                          self.profile_url(), 'ndjson')
+        self.assertIn('author.ndjson', response['Content-Disposition'])
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        posts = [row for row in rows if row['type'] == 'post']
+        comments = [row for row in rows if row['type'] == 'comment']
+        self.assertEqual([row['id'] for row in posts],
+                         [ExportTests.image_post.id]
+                         + [post.id for post in reversed(ExportTests.posts)])
+        self.assertEqual(posts[-1]['text'], ExportTests.posts[0].text)
+        self.assertEqual(posts[-2]['group'], 'test-slug')
+        self.assertEqual(comments, [{
+            'type': 'comment',
+            'id': comments[0]['id'],
+            'post_id': ExportTests.posts[0].id,
+            'author': 'reader',
+            'date': comments[0]['date'],
+            'text': 'Комментарий',
+        }])
+
+    def test_csv(self):
+        """Проверка CSV: заголовок и экранирование текста."""
+        _, content = self.download(self.author_client, self.profile_url(),
+                                   'csv')
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[-2]['text'], ExportTests.posts[0].text)
+        self.assertEqual(rows[-1]['type'], 'comment')
+
+    def test_zip(self):
+        """Проверка архива с выгрузкой и исходными картинками."""
+        _, content = self.download(self.author_client, self.profile_url(),
+                                   'zip')
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            image = ExportTests.image_post.image.name
+            self.assertEqual(archive.namelist(),
+                             ['posts.ndjson', f'images/{image}'])
+            self.assertEqual(archive.read(f'images/{image}'), SMALL_GIF)
+            lines = archive.read('posts.ndjson').decode().splitlines()
+        self.assertEqual(len(lines), 7)
+
+    def test_group_export(self):
+        """Проверка выгрузки группы администратором."""
+        client = Client()
+        client.force_login(ExportTests.admin)
+        _, content = self.download(
+            client, reverse('posts:group_export', args=('test-slug',)),
+            'ndjson'
+        )
+        self.assertEqual(len(content.decode().splitlines()), 2)
+
+    def test_permissions(self):
+        """Проверка, что чужие записи и группу выгрузить нельзя."""
+        client = Client()
+        client.force_login(ExportTests.reader)
+        for url in (self.profile_url(),
+                    reverse('posts:group_export', args=('test-slug',))):
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 403)
+        response = self.author_client.get(self.profile_url(),
+                                          {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(DATABASE_REPLICA='default')
+    def test_pinned_export_reads_primary(self):
+        """Проверка, что после своей записи автор выгружает с основной."""
+        with mock.patch('posts.views.stream_from_replica',
+                        side_effect=lambda chunks: chunks) as stream:
+            self.download(self.author_client, self.profile_url(), 'ndjson')
+            stream.assert_called_once()
+            self.author_client.cookies[settings.DB_PIN_COOKIE] = '1'
+            self.download(self.author_client, self.profile_url(), 'ndjson')
+            stream.assert_called_once()
+
+    def test_buffered(self):
+        """Проверка склейки мелких кусков в блоки."""
+        chunks = [b'x' * 1000] * 100
+        blocks = list(export.buffered(chunks))
+        self.assertEqual(b''.join(blocks), b''.join(chunks))
+        self.assertEqual(len(blocks), 2)
+
+    def test_command(self):
+        """Проверка команды export_posts."""
+        out = StringIO()
+        call_command('export_posts', author='author', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 7)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'group.csv')
+            call_command('export_posts', group='test-slug', format='csv',
+                         output=path)
+            with open(path, encoding='utf-8') as output:
+                self.assertEqual(len(list(csv.reader(output))), 3)
+        with self.assertRaises(CommandError):
+            call_command('export_posts', author='author', format='zip')
+        with self.assertRaises(CommandError):
+            call_command('export_posts', author='missing')
+        with self.assertRaises(CommandError):
+            call_command('export_posts')
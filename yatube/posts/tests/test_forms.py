@@ -1,19 +1,32 @@
+import os
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+
+from .. import uploads
 from ..models import Comment, Group, Post
 
+ORIENTATION = 0x0112
+CAMERA_MAKE = 0x010F
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_THUMBNAIL_INDEX = os.path.join(TEMP_MEDIA_ROOT, 'thumbnails.sqlite3')
 
 User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   THUMBNAIL_INDEX=TEMP_THUMBNAIL_INDEX)
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -213,3 +226,166 @@ class CommentCreateFormTests(TestCase):
         self.assertIn(comment,
                       obj,
                       'Комментарий не размещен')
+
+
+def image_file(name, image_format='PNG', size=(40, 20), exif=None):
+    """Картинка в памяти для загрузки."""
+    buffer = BytesIO()
+    params = {'exif': exif.tobytes()} if exif is not None else {}
+    Image.new('RGB', size, (255, 0, 0)).save(buffer, image_format, **params)
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type=f'image/{image_format.lower()}')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   THUMBNAIL_INDEX=TEMP_THUMBNAIL_INDEX)
+class ImageUploadLimitsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.client.force_login(ImageUploadLimitsTests.author)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDown()
+
+    def upload(self, image):
+        return self.client.post(reverse('posts:post_create'),
+                                data={'text': 'Текст', 'image': image})
+
+    def test_rejected_uploads(self):
+        """Проверка лимитов загрузки: пост не создается, есть ошибка."""
+        cases = (
+            ('bytes', {'POST_IMAGE_MAX_BYTES': 50},
+             image_file('big.png'), 'Файл больше'),
+            ('format', {},
+             SimpleUploadedFile('note.png', b'not an image at all',
+                                content_type='image/png'),
+             'Поддерживаются картинки'),
+            ('pixels', {'POST_IMAGE_MAX_PIXELS': 100},
+             image_file('wide.png'), 'слишком велика'),
+        )
+        for case, limits, image, message in cases:
+            with self.subTest(case=case), override_settings(**limits):
+                response = self.upload(image)
+                self.assertFalse(Post.objects.exists())
+                self.assertIn(message,
+                              ' '.join(response.context['form']
+                                       .errors['image']))
+
+    def test_rejected_in_admin(self):
+        """Проверка, что недописанный файл не сохраняется и из админки."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        self.client.force_login(admin)
+        buffer = BytesIO()
+        Image.effect_noise((600, 600), 50).save(buffer, 'JPEG')
+        # Заголовок JPEG целиком попадает в файл, а данные обрезаются:
+        # такой файл разбирается ImageField формы админки.
+        image = SimpleUploadedFile('big.jpg', buffer.getvalue(),
+                                   content_type='image/jpeg')
+        with override_settings(POST_IMAGE_MAX_BYTES=image.size // 2):
+            response = self.client.post(
+                reverse('admin:posts_post_add'),
+                data={'text': 'Текст', 'author': admin.pk, 'image': image}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Post.objects.exists())
+        self.assertIn('Файл больше',
+                      ' '.join(response.context['adminform'].form
+                               .errors['image']))
+
+    def test_rejected_on_save(self):
+        """Проверка, что модель не сохраняет файл с ошибкой загрузки."""
+        image = image_file('big.png')
+        image.upload_error = 'Файл больше 50 байт'
+        post = Post(text='Текст', author=ImageUploadLimitsTests.author,
+                    image=image)
+        with self.assertRaises(ValidationError):
+            post.full_clean()
+        with self.assertRaises(ValidationError):
+            post.save()
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(default_storage.exists('posts/big.png'))
+
+    def test_accepted_upload(self):
+        """Проверка, что картинка в пределах лимитов принимается."""
+        self.upload(image_file('fine.png'))
+        self.assertTrue(Post.objects.filter(image='posts/fine.png').exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   THUMBNAIL_INDEX=TEMP_THUMBNAIL_INDEX)
+class NormalizeImageTests(TestCase):
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDown()
+
+    def open_saved(self, name):
+        with default_storage.open(name) as saved:
+            image = Image.open(saved)
+            image.load()
+        return image
+
+    def test_exif_stripped_and_applied(self):
+        """EXIF удаляется, а поворот из него применяется к картинке."""
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        name = default_storage.save(
+            'posts/photo.jpg', image_file('photo.jpg', 'JPEG', exif=exif)
+        )
+        self.assertTrue(uploads.normalize(name))
+        image = self.open_saved(name)
+        self.assertEqual(image.size, (20, 40))
+        self.assertFalse(image.getexif())
+
+    def test_metadata_stripped_on_upload(self):
+        """EXIF убирается из загрузки до записи файла в хранилище."""
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        exif[CAMERA_MAKE] = 'Камера'
+        self.client.force_login(User.objects.create_user(username='author'))
+        self.client.post(reverse('posts:post_create'), data={
+            'text': 'Текст',
+            'image': image_file('photo.jpg', 'JPEG', exif=exif),
+        })
+        name = Post.objects.get().image.name
+        image = self.open_saved(name)
+        self.assertEqual(dict(image.getexif()), {ORIENTATION: 6},
+                         'Должен остаться только поворот')
+        self.assertEqual(image.size, (40, 20))
+
+        self.assertTrue(uploads.normalize(name))
+        image = self.open_saved(name)
+        self.assertEqual(image.size, (20, 40))
+        self.assertFalse(image.getexif())
+
+    def test_metadata_stripped_without_decoding(self):
+        """Метаданные вырезаются без декодирования пикселей."""
+        exif = Image.Exif()
+        exif[CAMERA_MAKE] = 'Камера'
+        upload = image_file('photo.jpg', 'JPEG', exif=exif)
+        original = Image.open(BytesIO(upload.read()))
+        original.load()
+        with mock.patch.object(Image.Image, 'load',
+                               side_effect=AssertionError):
+            self.assertTrue(uploads.strip_metadata(upload))
+        image = Image.open(upload)
+        self.assertFalse(image.getexif())
+        self.assertEqual(image.tobytes(), original.tobytes())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=10)
+    def test_resolution_capped(self):
+        """Большая картинка уменьшается до POST_IMAGE_MAX_SIDE."""
+        name = default_storage.save('posts/big.png', image_file('big.png'))
+        self.assertTrue(uploads.normalize(name))
+        self.assertEqual(self.open_saved(name).size, (10, 5))
+
+    def test_small_image_untouched(self):
+        """Картинка без EXIF и в пределах лимита не пересохраняется."""
+        name = default_storage.save('posts/ok.png', image_file('ok.png'))
+        self.assertFalse(uploads.normalize(name))
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from utils.explain import explain, sorts
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryPlanTests(TestCase):
+    """Основные запросы страниц идут по индексам без сортировки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        for i in range(15):
+            post = Post.objects.create(text=f'Текст {i}',
+                                       author=cls.author,
+                                       group=cls.group)
+            Comment.objects.create(post=post, author=cls.reader,
+                                   text=f'Комментарий {i}')
+        cls.post = post
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def ordered_queries(self, url):
+        """Запросы страницы с ORDER BY: выборки списков."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return [query['sql'] for query in queries
+                if query['sql'].startswith('SELECT')
+                and 'ORDER BY' in query['sql']]
+
+    def test_lists_without_sort(self):
+        """Проверка планов лент, профиля и комментариев записи."""
+        author = QueryPlanTests.author
+        post_id = QueryPlanTests.post.id
+        urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse('posts:group_list',
+                                        args=(QueryPlanTests.group.slug,)),
+            'posts:profile': reverse('posts:profile',
+                                     args=(author.username,)),
+            'posts:post_detail': reverse('posts:post_detail',
+                                         args=(post_id,)),
+            'posts:post_comments': reverse('posts:post_comments',
+                                           args=(post_id,)),
+        }
+        for name, url in urls.items():
+            queries = self.ordered_queries(url)
+            with self.subTest(name=name):
+                self.assertTrue(queries)
+            for sql in queries:
+                with self.subTest(name=name, sql=sql):
+                    plan = explain(sql)
+                    self.assertFalse(sorts(plan), '\n'.join(plan))
+
+    def test_follow_lookups(self):
+        """Проверка, что подписки ищутся по индексам с обеих сторон."""
+        author = QueryPlanTests.author
+        reader = QueryPlanTests.reader
+        querysets = {
+            'followers': Follow.objects.filter(author=author)
+            .values_list('user_id', flat=True),
+            'pair': Follow.objects.filter(user=reader, author=author),
+        }
+        for name, queryset in querysets.items():
+            with self.subTest(name=name):
+                sql, params = queryset.query.sql_with_params()
+                plan = ' '.join(explain(sql, params))
+                self.assertIn('USING', plan)
+                self.assertNotIn('SCAN', plan.replace('COVERING', ''))
@@ -0,0 +1,206 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.middleware import QueryCountMiddleware, QueryStats
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Оба объема больше одной страницы любого списка, чтобы сравнивать
+# одинаковые шаблоны: с паджинатором и подсчетом строк.
+SMALL = 25
+LARGE = 75
+
+# Наибольшее допустимое число запросов к базе для каждого маршрута,
+# включая чтение сессии и пользователя у авторизованных клиентов.
+QUERY_BUDGETS = {
+    'posts:index': 5,
+    # здесь, в profile и post_detail — еще запрос для ETag страницы
+    'posts:group_list': 5,
+    'posts:profile': 8,
+    'posts:post_detail': 5,
+    'posts:post_comments': 2,
+    'posts:authors_info': 5,
+    'posts:groups_info': 3,
+    'posts:follow_index': 5,
+    'posts:post_create': 3,
+    'posts:post_edit': 5,
+    'posts:search': 5,
+    # здесь и в post_delete — еще запрос к поисковому индексу
+    'posts:add_comment': 5,
+    'posts:profile_follow': 12,
+    'posts:profile_unfollow': 8,
+    'posts:post_delete': 11,
+    # выгрузка: записи и комментарии читаются кусками, но число
+    # запросов от объема не зависит
+    'posts:profile_export': 5,
+    'posts:group_export': 5,
+}
+
+
+@override_settings(CONDITIONAL_PAGES=True)
+class QueryBudgetTests(TestCase):
+    """Число запросов каждого маршрута не зависит от объема данных."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.admin = User.objects.create_user(username='admin',
+                                             is_staff=True)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы'
+        )
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(QueryBudgetTests.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(QueryBudgetTests.reader)
+        self.admin_client = Client()
+        self.admin_client.force_login(QueryBudgetTests.admin)
+        Follow.objects.create(user=QueryBudgetTests.reader,
+                              author=QueryBudgetTests.author)
+        self.post = self.add_data(SMALL)
+
+    def add_data(self, size):
+        """Добавляет записи, комментарии и подписчиков автора."""
+        author = QueryBudgetTests.author
+        for i in range(size):
+            post = Post.objects.create(text=f'Текст поста {i}',
+                                       author=author,
+                                       group=QueryBudgetTests.group)
+            Comment.objects.create(post=post, author=author,
+                                   text=f'Комментарий {i}')
+            follower = User.objects.create_user(
+                username=f'follower_{User.objects.count()}'
+            )
+            Follow.objects.create(user=follower, author=author)
+        return post
+
+    def requests(self):
+        """Маршруты posts/urls.py: имя, клиент, метод, адрес."""
+        author = QueryBudgetTests.author
+        post_id = self.post.id
+        return (
+            ('posts:index', self.reader_client, 'get',
+             reverse('posts:index')),
+            ('posts:group_list', self.reader_client, 'get',
+             reverse('posts:group_list', args=(QueryBudgetTests.group.slug,))),
+            ('posts:profile', self.reader_client, 'get',
+             reverse('posts:profile', args=(author.username,))),
+            ('posts:post_detail', self.reader_client, 'get',
+             reverse('posts:post_detail', args=(post_id,))),
+            ('posts:post_comments', self.reader_client, 'get',
+             reverse('posts:post_comments', args=(post_id,))),
+            ('posts:authors_info', self.reader_client, 'get',
+             reverse('posts:authors_info')),
+            ('posts:groups_info', self.reader_client, 'get',
+             reverse('posts:groups_info')),
+            ('posts:follow_index', self.reader_client, 'get',
+             reverse('posts:follow_index')),
+            ('posts:search', self.reader_client, 'get',
+             f'{reverse("posts:search")}?q=текст'),
+            ('posts:post_create', self.author_client, 'get',
+             reverse('posts:post_create')),
+            ('posts:post_edit', self.author_client, 'get',
+             reverse('posts:post_edit', args=(post_id,))),
+            ('posts:add_comment', self.reader_client, 'post',
+             reverse('posts:add_comment', args=(post_id,))),
+            ('posts:profile_unfollow', self.reader_client, 'get',
+             reverse('posts:profile_unfollow', args=(author.username,))),
+            ('posts:profile_follow', self.reader_client, 'get',
+             reverse('posts:profile_follow', args=(author.username,))),
+            ('posts:post_delete', self.author_client, 'get',
+             reverse('posts:post_delete', args=(post_id,))),
+            ('posts:profile_export', self.author_client, 'get',
+             reverse('posts:profile_export', args=(author.username,))),
+            ('posts:group_export', self.admin_client, 'get',
+             reverse('posts:group_export',
+                     args=(QueryBudgetTests.group.slug,))),
+        )
+
+    def count_queries(self):
+        counts = {}
+        for name, client, method, url in self.requests():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(
+                    url, {'text': 'Комментарий'} if method == 'post' else {}
+                )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            counts[name] = len(queries)
+        return counts
+
+    def test_all_routes_have_budget(self):
+        """Проверка, что для каждого маршрута задан бюджет запросов."""
+        names = {name for name, *_ in self.requests()}
+        self.assertEqual(names, set(QUERY_BUDGETS))
+
+    def test_query_budget(self):
+        """Проверка бюджета запросов на малом и большом объеме данных."""
+        small = self.count_queries()
+        self.post = self.add_data(LARGE - SMALL)
+        large = self.count_queries()
+
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(name=name):
+                self.assertEqual(small[name], large[name],
+                                 f'Число запросов {name} зависит от данных')
+                self.assertLessEqual(large[name], budget,
+                                     f'Превышен бюджет запросов {name}')
+
+
+class QueryCountMiddlewareTests(TestCase):
+    """Проверка журнала запросов к базе."""
+
+    def test_report_logged(self):
+        """Итог по запросу пишется в лог с именем маршрута."""
+        with self.assertLogs('yatube.queries', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        record = logs.records[-1]
+        self.assertEqual(record.url_name, 'posts:index')
+        self.assertGreater(record.queries, 0)
+
+    @override_settings(QUERY_COUNT_WARNING=0)
+    def test_warning_over_budget(self):
+        """Превышение QUERY_COUNT_WARNING пишется как предупреждение."""
+        with self.assertLogs('yatube.queries', 'WARNING'):
+            self.client.get(reverse('posts:groups_info'))
+
+    @override_settings(QUERY_DUPLICATE_THRESHOLD=3)
+    def test_duplicates_threshold(self):
+        """Повтором считается запрос, выполненный не меньше трех раз."""
+        def execute(sql, params, many, context):
+            return None
+
+        stats = QueryStats()
+        for group_id in (1, 2):
+            stats(execute, 'UPDATE group', (group_id,), False, {})
+        self.assertEqual(stats.duplicates, {})
+        stats(execute, 'UPDATE group', (3,), False, {})
+        self.assertEqual(stats.duplicates, {'UPDATE group': 3})
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        """В режиме отладки число запросов передается в заголовках."""
+        def view(request):
+            list(Group.objects.all())
+            return HttpResponse()
+
+        request = RequestFactory().get(reverse('posts:groups_info'))
+        request.resolver_match = None
+        response = QueryCountMiddleware(view)(request)
+        self.assertEqual(response['X-Query-Count'], '1')
+        self.assertIn('X-Query-Count', response)
+        self.assertIn('X-Query-Time', response)
@@ -0,0 +1,175 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from utils.stemmer import stem, stems
+from .. import search
+from ..models import Comment, Post, PostSearch
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    def create_post(self, text):
+        return Post.objects.create(text=text, author=SearchTest.user)
+
+    def found(self, query, **params):
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': query, **params})
+        return [post.text for post in response.context['page_obj']]
+
+    def test_word_forms(self):
+        """Запрос находит другие формы тех же слов."""
+        self.create_post('Мои коты любят рыбу')
+        self.create_post('Собака лает')
+        for query in ('кот', 'котами', 'КОТЫ рыба'):
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), ['Мои коты любят рыбу'])
+        self.assertEqual(self.found('кот собака'), [])
+
+    def test_ranked_by_text_over_comments(self):
+        """Совпадение в тексте записи важнее совпадения в комментарии."""
+        in_text = self.create_post('Пишу о путешествиях по горам')
+        in_comment = self.create_post('Отчет о выходных')
+        Comment.objects.create(post=in_comment, author=SearchTest.user,
+                               text='Были ли вы в горах?')
+        self.assertEqual(self.found('горы'),
+                         [in_text.text, in_comment.text])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении записи."""
+        post = self.create_post('Старый текст')
+        post = Post.objects.get(pk=post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(self.found('старый'), [])
+        self.assertEqual(self.found('новые'), ['Новый текст'])
+        post.delete()
+        self.assertEqual(self.found('новый'), [])
+        self.assertFalse(PostSearch.objects.exists())
+
+    @mock.patch('posts.search.transaction.on_commit',
+                side_effect=lambda callback: callback())
+    def test_comment_changes(self, on_commit):
+        """Правка и удаление комментария переиндексируют запись."""
+        post = self.create_post('Запись')
+        comment = Comment.objects.create(post=post, author=SearchTest.user,
+                                         text='Отличная погода')
+        self.assertEqual(self.found('погоды'), ['Запись'])
+        comment.text = 'Дождливый день'
+        comment.save()
+        self.assertEqual(self.found('погода'), [])
+        self.assertEqual(self.found('дождь дни'), [])
+        self.assertEqual(self.found('дождливые'), ['Запись'])
+        comment.delete()
+        self.assertEqual(self.found('дождливый'), [])
+
+    @override_settings(POSTS_ON_PAGE=3)
+    def test_keyset_pages(self):
+        """Страницы результатов идут по курсору без повторов."""
+        for i in range(7):
+            self.create_post(f'Заметка о погоде {i}')
+        response = self.client.get(reverse('posts:search'), {'q': 'погода'})
+        seen = []
+        while True:
+            page_obj = response.context['page_obj']
+            seen.extend(post.text for post in page_obj)
+            cursor = page_obj.paginator.next_cursor
+            if cursor is None:
+                break
+            response = self.client.get(reverse('posts:search'),
+                                       {'q': 'погода', 'cursor': cursor})
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_empty_query(self):
+        """Пустой запрос и запрос без слов ничего не ищут."""
+        self.create_post('Текст')
+        for query in ('', '   ', '!?'):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('posts:search'),
+                                           {'q': query})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context['page_obj'] or []),
+                                 [])
+
+    @override_settings(SEARCH_BACKEND='posts.search.SearchBackend')
+    def test_backend_without_index(self):
+        """Бэкенд без индекса находит записи по основам слов."""
+        self.create_post('latin words here')
+        self.create_post('other text')
+        self.assertEqual(self.found('word'), ['latin words here'])
+
+    @override_settings(SEARCH_BACKEND=None)
+    def test_backend_by_vendor(self):
+        """Без SEARCH_BACKEND другая СУБД не пишет в posts_search."""
+        self.assertIsInstance(search.get_backend(), search.SQLiteFTSBackend)
+        search.reset_backend('SEARCH_BACKEND')
+        with mock.patch('posts.search.connection',
+                        mock.Mock(vendor='postgresql')):
+            self.assertIs(type(search.get_backend()), search.SearchBackend)
+        self.assert_index_untouched()
+
+    @override_settings(SEARCH_BACKEND='posts.search.SQLiteFTSBackend')
+    def test_backend_without_table(self):
+        """Без таблицы индекса используется поиск без индекса."""
+        with mock.patch.object(connection.introspection, 'table_names',
+                               return_value=[]), \
+                self.assertLogs('yatube.search', 'WARNING'):
+            self.assertIs(type(search.get_backend()), search.SearchBackend)
+        self.assert_index_untouched()
+
+    def assert_index_untouched(self):
+        with CaptureQueriesContext(connection) as queries:
+            post = self.create_post('Запись')
+            post.text = 'Правка'
+            post.save()
+            Comment.objects.create(post=post, author=SearchTest.user,
+                                   text='Комментарий')
+            post.delete()
+        self.assertFalse([query for query in queries
+                          if 'posts_search' in query['sql']])
+        search.reset_backend('SEARCH_BACKEND')
+
+    def test_rebuild(self):
+        """Команда заново строит индекс по записям и комментариям."""
+        post = self.create_post('Запись о море')
+        Comment.objects.create(post=post, author=SearchTest.user,
+                               text='Люблю песок')
+        PostSearch.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Проиндексировано записей: 1', out.getvalue())
+        self.assertEqual(self.found('морем песок'), ['Запись о море'])
+
+
+class StemmerTests(SimpleTestCase):
+
+    def test_word_forms(self):
+        """Проверка, что формы одного слова дают одну основу."""
+        cases = {
+            'кот': ('кот', 'кота', 'котами', 'Коты'),
+            'красив': ('красивая', 'красивейший', 'красивые'),
+            'книг': ('книга', 'книги', 'книгами'),
+            'елк': ('ёлки', 'елка'),
+        }
+        for expected, words in cases.items():
+            for word in words:
+                with self.subTest(word=word):
+                    self.assertEqual(stem(word), expected)
+
+    def test_text(self):
+        """Проверка разбора текста: латиница и числа не меняются."""
+        self.assertEqual(stems('Django 2.2 и коты!'),
+                         ['django', '2', '2', 'и', 'кот'])
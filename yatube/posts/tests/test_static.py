@@ -0,0 +1,134 @@
+import gzip
+import os
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from core.static import StaticFilesApplication, accepted_encodings
+from core.storage import minify_css
+
+CSS = '''/* Оформление */
+body {
+    background: url("../img/logo.png");
+    content: "a  /* b */";
+}
+'''
+
+
+class StaticPipelineTests(SimpleTestCase):
+    """Сборка статики и ее раздача WSGI-оберткой."""
+
+    def setUp(self):
+        source = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        files = {
+            'css/site.css': CSS.encode() * 20,
+            'img/logo.png': b'\x89PNG' + bytes(range(256)),
+        }
+        for name, content in files.items():
+            path = os.path.join(source.name, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(content)
+        settings = override_settings(STATICFILES_DIRS=[source.name],
+                                     STATIC_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.css = staticfiles_storage.stored_name('css/site.css')
+
+    def read(self, name):
+        with open(os.path.join(self.root, *name.split('/')), 'rb') as file:
+            return file.read()
+
+    def request(self, path, **environ):
+        calls = []
+
+        def application(environ, start_response):
+            start_response('404 Not Found', [])
+            return [b'django']
+
+        def start_response(status, headers):
+            calls.append((status, dict(headers)))
+
+        body = b''.join(StaticFilesApplication(application)(
+            {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', **environ},
+            start_response
+        ))
+        status, headers = calls[0]
+        return status, headers, body
+
+    def test_collectstatic(self):
+        """Проверка хэша в имени, минификации и сжатых копий."""
+        self.assertRegex(self.css, r'^css/site\.[0-9a-f]{12}\.css$')
+        css = self.read(self.css).decode()
+        self.assertNotIn('Оформление', css)
+        self.assertIn('"a  /* b */"', css)
+        self.assertRegex(css, r'url\("\.\./img/logo\.[0-9a-f]{12}\.png"\)')
+        self.assertEqual(gzip.decompress(self.read(f'{self.css}.gz')),
+                         css.encode())
+        logo = staticfiles_storage.stored_name('img/logo.png')
+        self.assertFalse(staticfiles_storage.exists(f'{logo}.gz'))
+
+    def test_serve_compressed(self):
+        """Проверка выбора сжатой копии и заголовков кэширования."""
+        status, headers, body = self.request(
+            f'/static/{self.css}', HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Content-Type'], 'text/css')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(gzip.decompress(body), self.read(self.css))
+
+        status, headers, body = self.request(f'/static/{self.css}')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, self.read(self.css))
+
+        status, headers, body = self.request('/static/css/site.css')
+        self.assertNotIn('immutable', headers['Cache-Control'])
+
+    def test_not_static(self):
+        """Проверка, что прочие запросы уходят в Django."""
+        for path in ('/', '/static/missing.css', '/static/../settings.py'):
+            with self.subTest(path=path):
+                self.assertEqual(self.request(path)[2], b'django')
+
+    def test_not_modified(self):
+        """Проверка ответа 304 по If-Modified-Since."""
+        _, headers, _ = self.request(f'/static/{self.css}')
+        status, _, body = self.request(
+            f'/static/{self.css}',
+            HTTP_IF_MODIFIED_SINCE=headers['Last-Modified']
+        )
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(body, b'')
+
+    def test_template_without_manifest(self):
+        """Проверка, что без collectstatic ссылки остаются исходными."""
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(STATIC_ROOT=root):
+            self.assertEqual(staticfiles_storage.url('css/other.css'),
+                             '/static/css/other.css')
+
+
+class StaticHelpersTests(SimpleTestCase):
+
+    def test_minify_css(self):
+        """Проверка, что минификация не меняет строки."""
+        self.assertEqual(minify_css('a , b  >  c {\n  color : red;\n}'),
+                         'a,b>c{color : red}')
+        self.assertEqual(minify_css("a { content: ' ; ' }"),
+                         "a{content: ' ; '}")
+
+    def test_accepted_encodings(self):
+        """Проверка разбора Accept-Encoding."""
+        self.assertEqual(accepted_encodings('gzip;q=0.5, br;q=0, deflate'),
+                         {'gzip', 'deflate'})
+        self.assertEqual(accepted_encodings(''), set())
@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.shortcuts import render
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from core.middleware import TemplateProfileMiddleware
+from core.templates import track_templates
+from ..models import Post
+
+User = get_user_model()
+
+
+class TemplateLoaderTests(SimpleTestCase):
+
+    def test_cached_loader(self):
+        """Проверка, что шаблоны компилируются один раз на процесс."""
+        engine = engines['django'].engine
+        self.assertIsInstance(engine.template_loaders[0], CachedLoader)
+        template = engine.get_template('base.html')
+        self.assertIs(engine.get_template('base.html'), template)
+
+
+class TemplateProfileTests(TestCase):
+    """Замер времени рендеринга шаблонов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        for i in range(3):
+            Post.objects.create(text=f'Текст поста {i}', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_track_templates(self):
+        """Проверка вызовов и времени шаблонов страницы с include."""
+        with track_templates() as stats:
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        templates = stats.templates
+        self.assertEqual(templates['posts/index.html'].calls, 1)
+        self.assertEqual(templates['includes/header.html'].calls, 1)
+        self.assertEqual(templates['posts/includes/post_list.html'].calls,
+                         3)
+        for name, timing in templates.items():
+            with self.subTest(template=name):
+                self.assertLessEqual(timing.own, timing.total)
+        root = templates['posts/index.html']
+        self.assertAlmostEqual(stats.duration, root.total, places=6)
+        self.assertEqual(stats.top(1)[0][1].own,
+                         max(timing.own for timing in templates.values()))
+
+    def test_outside_block(self):
+        """Проверка, что вне блока шаблоны не замеряются."""
+        with track_templates() as stats:
+            pass
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(stats.templates, {})
+
+    @override_settings(TEMPLATE_PROFILE=True, DEBUG=True)
+    def test_middleware(self):
+        """Проверка записи в лог и заголовка в режиме отладки."""
+        def view(request):
+            return render(request, 'posts/groups_info.html', {'groups': []})
+
+        request = RequestFactory().get(reverse('posts:groups_info'))
+        request.resolver_match = None
+        request.user = AnonymousUser()
+        with self.assertLogs('yatube.templates', 'INFO') as logs:
+            response = TemplateProfileMiddleware(view)(request)
+        record = logs.records[-1]
+        self.assertEqual(record.url_name, request.path)
+        self.assertIn('posts/groups_info.html', record.templates)
+        self.assertIn('X-Template-Time', response)
+
+    def test_middleware_disabled(self):
+        """Проверка, что без TEMPLATE_PROFILE middleware не используется."""
+        with self.assertRaises(MiddlewareNotUsed):
+            TemplateProfileMiddleware(lambda request: None)
@@ -0,0 +1,325 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from utils.cache import get_version
+from .. import thumbnails
+from ..models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_THUMBNAIL_INDEX = os.path.join(TEMP_MEDIA_ROOT, 'thumbnails.sqlite3')
+
+User = get_user_model()
+
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+
+
+def thumbnail_exists(name):
+    backend = thumbnails.AsyncThumbnailBackend()
+    geometry_string, options = thumbnails.POST_THUMBNAILS[0]
+    thumbnail = backend.thumbnail_name(name, geometry_string, options)
+    return ImageFile(thumbnail, default.storage).exists()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   THUMBNAIL_INDEX=TEMP_THUMBNAIL_INDEX)
+class ThumbnailsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        default.kvstore.clear()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_post(self, name='small.gif'):
+        return Post.objects.create(
+            text='Тестовый текст',
+            author=ThumbnailsTest.user,
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif')
+        )
+
+    @mock.patch('posts.signals.transaction.on_commit',
+                side_effect=lambda callback: callback())
+    @mock.patch('posts.thumbnails.schedule')
+    def test_scheduled_on_image_change(self, schedule, on_commit):
+        """Миниатюры заказываются только для новой картинки."""
+        post = self.create_post()
+        schedule.assert_called_once_with(
+            post.image.name, {'index', f'author:{post.author_id}'}
+        )
+
+        post = Post.objects.get(pk=post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        schedule.assert_called_once()
+
+        post.image = SimpleUploadedFile('other.gif', SMALL_GIF, 'image/gif')
+        post.save()
+        self.assertEqual(schedule.call_count, 2)
+        self.assertEqual(schedule.call_args[0][0], post.image.name)
+
+    def test_variants_saved_with_post(self):
+        """Варианты картинки пишутся тем же запросом, что и пост."""
+        with CaptureQueriesContext(connection) as queries:
+            post = self.create_post()
+        self.assertFalse([query for query in queries
+                          if query['sql'].startswith('UPDATE "posts_post"')])
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants,
+                         thumbnails.describe(post.image.name))
+
+        post.image = SimpleUploadedFile('other.gif', SMALL_GIF, 'image/gif')
+        post.save(update_fields=['image'])
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants,
+                         thumbnails.describe(post.image.name))
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_generated_inline_without_workers(self):
+        """Без потоков миниатюры создаются сразу."""
+        post = self.create_post()
+        self.assertIsNone(thumbnails.schedule(post.image.name))
+        self.assertTrue(thumbnail_exists(post.image.name))
+
+    def test_placeholder_while_pending(self):
+        """Пока миниатюра готовится, шаблон получает заглушку."""
+        post = self.create_post()
+        release = threading.Event()
+        create_files = thumbnails.create_files
+
+        def slow_create_files(name):
+            release.wait(5)
+            return create_files(name)
+
+        geometry_string, options = thumbnails.POST_THUMBNAILS[0]
+        with mock.patch('posts.thumbnails.create_files', slow_create_files):
+            future = thumbnails.schedule(post.image.name)
+            thumbnail = get_thumbnail(post.image, geometry_string,
+                                      **options)
+            self.assertIsInstance(thumbnail, thumbnails.PendingThumbnail)
+            self.assertTrue(thumbnail.url.startswith('data:image/svg+xml'))
+            release.set()
+            future.result(timeout=5)
+        self.assertTrue(thumbnail_exists(post.image.name))
+        self.assertNotIn(
+            thumbnails.AsyncThumbnailBackend().thumbnail_name(
+                post.image.name, geometry_string, options
+            ),
+            thumbnails._pending
+        )
+
+    @override_settings(THUMBNAIL_WAIT_TIMEOUT=0)
+    def test_worker_not_kept_waiting(self):
+        """Без таймаута воркер не ждет миниатюры после ответа."""
+        post = self.create_post()
+        release = threading.Event()
+        create_files = thumbnails.create_files
+
+        def slow_create_files(name):
+            release.wait(5)
+            return create_files(name)
+
+        with mock.patch('posts.thumbnails.create_files', slow_create_files):
+            future = thumbnails.schedule(post.image.name)
+            thumbnails.wait_scheduled()
+            self.assertFalse(future.done())
+            release.set()
+            future.result(timeout=5)
+
+    def test_pending_shared_between_processes(self):
+        """Заглушку видят и процессы, не ставившие задание."""
+        cache.clear()
+        post = self.create_post()
+        thumbnails.set_state(post.image.name, thumbnails.PENDING)
+        post = Post.objects.get(pk=post.pk)
+        self.assertNotIn(post.image.name, thumbnails._pending)
+        self.assertIn('placeholder', thumbnails.picture(post))
+        self.assertTrue(thumbnails.is_pending(post))
+
+        cache.delete(thumbnails.state_key(post.image.name))
+        thumbnails.create_files(post.image.name)
+        post = Post.objects.get(pk=post.pk)
+        self.assertIn('srcset', thumbnails.picture(post))
+        self.assertFalse(thumbnails.is_pending(post))
+        self.assertEqual(cache.get(thumbnails.state_key(post.image.name)),
+                         thumbnails.READY)
+
+    def test_failed_job_falls_back_to_original(self):
+        """Если миниатюры не созданы, выводится оригинал картинки."""
+        cache.clear()
+        post = self.create_post()
+        with mock.patch('posts.thumbnails.create_files', return_value=False):
+            thumbnails.schedule(post.image.name).result(timeout=5)
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(thumbnails.picture(post),
+                         {'original': post.image.url})
+        self.assertTrue(thumbnails.is_pending(post))
+
+    def test_lists_invalidated_when_ready(self):
+        """Готовые миниатюры делают устаревшими списки с заглушкой."""
+        post = self.create_post()
+        version = get_version('index')
+        future = thumbnails.schedule(post.image.name, {'index'})
+        future.result(timeout=5)
+        self.assertNotEqual(get_version('index'), version)
+
+    def test_warm_thumbnails(self):
+        """Команда создает миниатюры и варианты для старых картинок."""
+        posts = [self.create_post(f'image_{i}.gif') for i in range(3)]
+        Post.objects.update(image_variants='')
+        out = StringIO()
+        call_command('warm_thumbnails', workers=2, stdout=out)
+        self.assertIn('Обработано картинок: 3, с ошибками: 0',
+                      out.getvalue())
+        for post in posts:
+            with self.subTest(image=post.image.name):
+                self.assertTrue(thumbnail_exists(post.image.name))
+                post.refresh_from_db()
+                self.assertEqual(post.image_variants,
+                                 thumbnails.describe(post.image.name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   THUMBNAIL_INDEX=TEMP_THUMBNAIL_INDEX,
+                   THUMBNAIL_WORKERS=0)
+class IndexKVStoreTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def tearDown(self):
+        default.kvstore.clear()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDown()
+
+    def create_posts(self, size):
+        posts = []
+        for i in range(size):
+            post = Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=IndexKVStoreTest.user,
+                image=SimpleUploadedFile(f'image_{i}.gif', SMALL_GIF,
+                                         'image/gif')
+            )
+            thumbnails.schedule(post.image.name)
+            posts.append(post)
+        return posts
+
+    def test_index_shared_between_stores(self):
+        """Записи индекса видны новому процессу с пустым LRU."""
+        store = thumbnails.IndexKVStore()
+        store._set_raw('key', 'value')
+        self.assertEqual(thumbnails.IndexKVStore()._get_raw('key'), 'value')
+        store._delete_raw('key')
+        self.assertIsNone(thumbnails.IndexKVStore()._get_raw('key'))
+
+    @override_settings(THUMBNAIL_INDEX_LRU_SIZE=2)
+    def test_lru_bounded(self):
+        """LRU хранит не больше THUMBNAIL_INDEX_LRU_SIZE записей."""
+        store = thumbnails.IndexKVStore()
+        for key in ('first', 'second', 'third'):
+            store._set_raw(key, key)
+        self.assertEqual(list(store._lru), ['second', 'third'])
+
+    def test_prefetch_single_lookup(self):
+        """Миниатюры постов без вариантов загружаются одним запросом."""
+        self.create_posts(3)
+        Post.objects.update(image_variants='')
+        posts = list(Post.objects.all())
+        store = default.kvstore
+        store._forget()
+        statements = []
+        store.connection.set_trace_callback(statements.append)
+        try:
+            thumbnails.prefetch(posts)
+            geometry_string, options = thumbnails.FALLBACK_THUMBNAIL
+            for post in posts:
+                get_thumbnail(post.image, geometry_string, **options)
+        finally:
+            store.connection.set_trace_callback(None)
+        self.assertEqual(len(statements), 1)
+
+    def test_variants_recorded(self):
+        """Варианты картинки записываются в пост и создаются все."""
+        post = self.create_posts(1)[0]
+        post.refresh_from_db()
+        variants = json.loads(post.image_variants)
+        self.assertEqual(len(variants), len(thumbnails.POST_THUMBNAILS))
+        self.assertEqual(
+            {variant['width'] for variant in variants},
+            set(thumbnails.POST_IMAGE_WIDTHS)
+        )
+        for variant in variants:
+            with self.subTest(variant=variant['name']):
+                self.assertTrue(
+                    ImageFile(variant['name'], default.storage).exists()
+                )
+
+    def test_picture_markup(self):
+        """Шаблон выводит srcset и размеры без чтения файлов."""
+        self.create_posts(1)
+        with mock.patch.object(ImageFile, 'size',
+                               side_effect=AssertionError):
+            response = self.client.get(reverse('posts:index'))
+        content = response.content.decode()
+        self.assertIn('srcset="', content)
+        self.assertIn('480w', content)
+        self.assertIn('width="960"', content)
+        self.assertIn('height="339"', content)
+
+    def test_page_without_db_lookups(self):
+        """Страница с картинками не обращается к kvstore в базе."""
+        self.create_posts(3)
+        default.kvstore._forget()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        self.assertFalse([query for query in queries
+                          if 'thumbnail_kvstore' in query['sql']])
+
+    @override_settings(THUMBNAIL_WORKERS=2, THUMBNAIL_WAIT_TIMEOUT=5)
+    @mock.patch('posts.signals.transaction.on_commit',
+                side_effect=lambda callback: callback())
+    def test_forget_on_image_change(self, on_commit):
+        """Смена картинки удаляет миниатюры и варианты прежней."""
+        post = self.create_posts(1)[0]
+        thumbnails.wait_scheduled()
+        old_name = post.image.name
+        old_variants = [variant['name']
+                        for variant in json.loads(post.image_variants)]
+        self.assertTrue(all(default.storage.exists(name)
+                            for name in old_variants))
+        post.image = SimpleUploadedFile('other.gif', SMALL_GIF, 'image/gif')
+        post.save()
+        thumbnails.wait_scheduled()
+        self.assertFalse(any(default.storage.exists(name)
+                             for name in old_variants))
+        self.assertIsNone(default.kvstore.get(ImageFile(old_name)))
+        self.assertTrue(thumbnail_exists(post.image.name))
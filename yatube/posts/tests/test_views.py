@@ -1,25 +1,37 @@
+import os
 import shutil
 import tempfile
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from ..models import Follow, Group, Post
+from utils.counting import count_key
+from .. import stats
+from ..models import (Comment, Follow, Group, Post, TimelineEntry,
+                      UserStats)
 
 COUNT_POSTS: int = 15
 POSTS_ON_LAST_PAGE: int = COUNT_POSTS % settings.POSTS_ON_PAGE
 NUMBER_LAST_PAGE: int = (COUNT_POSTS // settings.POSTS_ON_PAGE) + 1
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_THUMBNAIL_INDEX = os.path.join(TEMP_MEDIA_ROOT, 'thumbnails.sqlite3')
 
 User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   THUMBNAIL_INDEX=TEMP_THUMBNAIL_INDEX)
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -258,16 +270,16 @@ class PostPagesTests(TestCase):
 
     def test_cache(self):
         """Проверка корректного кэширования данных главной страницы."""
-        response_before_del = PostPagesTests.auth_client_author.get(
+        response_before_update = PostPagesTests.auth_client_author.get(
             reverse('posts:index')
         )
-        response_before_del.context['page_obj'][0].delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
 
-        response_after_del = PostPagesTests.auth_client_author.get(
+        response_after_update = PostPagesTests.auth_client_author.get(
             reverse('posts:index')
         )
-        self.assertEqual(response_before_del.content,
-                         response_after_del.content,
+        self.assertEqual(response_before_update.content,
+                         response_after_update.content,
                          'Ошибка кэша')
 
         cache.clear()
@@ -275,9 +287,49 @@ class PostPagesTests(TestCase):
         response_after_cache_clear = PostPagesTests.auth_client_author.get(
             reverse('posts:index')
         )
-        self.assertNotEqual(response_before_del.content,
+        self.assertNotEqual(response_before_update.content,
                             response_after_cache_clear.content,
-                            'Ошибка удаления записи')
+                            'Ошибка очистки кэша')
+
+    def test_cache_invalidated_on_post_delete(self):
+        """Проверка сброса кэша страниц при удалении записи."""
+        reverse_names = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.post.author})
+        ]
+        responses_before_del = [
+            PostPagesTests.auth_client_author.get(name)
+            for name in reverse_names
+        ]
+        self.post.delete()
+
+        for name, response_before_del in zip(reverse_names,
+                                             responses_before_del):
+            with self.subTest(name=name):
+                response = PostPagesTests.auth_client_author.get(name)
+                self.assertNotEqual(response_before_del.content,
+                                    response.content,
+                                    'Кэш не сброшен после удаления записи')
+
+    def test_cache_kept_for_other_group(self):
+        """Проверка, что запись другой группы не сбрасывает кэш группы."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        response_before = PostPagesTests.auth_client_author.get(url)
+        other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Описание другой группы'
+        )
+        Post.objects.create(text='Запись другой группы',
+                            author=PostPagesTests.user,
+                            group=other_group)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+
+        response_after = PostPagesTests.auth_client_author.get(url)
+        self.assertEqual(response_before.content,
+                         response_after.content,
+                         'Кэш группы сброшен чужой записью')
 
 
 class FollowCreateTest(TestCase):
@@ -393,6 +445,107 @@ class FollowCreateTest(TestCase):
                          response_client_2.context['page_obj'],
                          'Ошибочное размещение записи')
 
+    def test_follow_counters(self):
+        """Проверка счетчиков подписок и их пересчета."""
+        follow = Follow.objects.create(user=FollowCreateTest.user_1,
+                                       author=FollowCreateTest.author)
+        author_stats = UserStats.objects.get(user=FollowCreateTest.author)
+        user_stats = UserStats.objects.get(user=FollowCreateTest.user_1)
+        self.check_counters((('followers_count', author_stats, 1),
+                             ('posts_count', author_stats, 1),
+                             ('following_count', user_stats, 1)))
+
+        follow.delete()
+        UserStats.objects.update(posts_count=100)
+        call_command('recount_stats', stdout=StringIO())
+        author_stats.refresh_from_db()
+        self.check_counters((('followers_count', author_stats, 0),
+                             ('posts_count', author_stats, 1)))
+
+    def check_counters(self, counters):
+        """Вспомогательная функция для проверки счетчиков"""
+        for name, obj, expected in counters:
+            with self.subTest(name=name):
+                self.assertEqual(getattr(obj, name),
+                                 expected,
+                                 f'Неверный счетчик {name}')
+
+    def test_timeline_fan_out_and_prune(self):
+        """Проверка раздачи новых записей по лентам и очистки при отписке."""
+        Follow.objects.create(user=FollowCreateTest.user_1,
+                              author=FollowCreateTest.author)
+        new_post = Post.objects.create(text='Новая запись',
+                                       author=FollowCreateTest.author)
+        entries = TimelineEntry.objects.filter(user=FollowCreateTest.user_1)
+        self.assertEqual(set(entries.values_list('post_id', flat=True)),
+                         {self.post.id, new_post.id},
+                         'Записи автора должны попасть в ленту подписчика')
+
+        FollowCreateTest.auth_client_1.get(
+            reverse('posts:profile_unfollow', kwargs={'username': self.author})
+        )
+        self.assertFalse(entries.exists(), 'Лента не очищена после отписки')
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_timeline_reads_celebrity_posts(self):
+        """Проверка ленты с записями автора, которые не раздавались."""
+        cache.clear()
+        Follow.objects.create(user=FollowCreateTest.user_1,
+                              author=FollowCreateTest.author)
+        new_post = Post.objects.create(text='Новая запись',
+                                       author=FollowCreateTest.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        response = FollowCreateTest.auth_client_1.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(list(response.context['page_obj']),
+                         [new_post, self.post])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2)
+    def test_timeline_after_author_becomes_celebrity(self):
+        """Проверка ленты подписчика, с которым автор стал знаменитостью."""
+        cache.clear()
+        Follow.objects.create(user=FollowCreateTest.user_1,
+                              author=FollowCreateTest.author)
+        FollowCreateTest.auth_client_1.get(reverse('posts:follow_index'))
+        Follow.objects.create(user=FollowCreateTest.user_2,
+                              author=FollowCreateTest.author)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=FollowCreateTest.user_2
+        ).exists())
+
+        response = FollowCreateTest.auth_client_2.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2, TIMELINE_WORKERS=0)
+    def test_timeline_restored_after_unfollow(self):
+        """Проверка отложенной раздачи записей бывшей знаменитости."""
+        cache.clear()
+        Follow.objects.create(user=FollowCreateTest.user_1,
+                              author=FollowCreateTest.author)
+        Follow.objects.create(user=FollowCreateTest.user_2,
+                              author=FollowCreateTest.author)
+        new_post = Post.objects.create(text='Новая запись',
+                                       author=FollowCreateTest.author)
+        entries = TimelineEntry.objects.filter(user=FollowCreateTest.user_1,
+                                               post=new_post)
+        callbacks = []
+        with mock.patch('posts.timeline.transaction.on_commit',
+                        side_effect=callbacks.append):
+            FollowCreateTest.auth_client_2.get(reverse(
+                'posts:profile_unfollow', kwargs={'username': self.author}
+            ))
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(entries.exists(),
+                         'Раздача не должна выполняться в запросе отписки')
+
+        callbacks[0]()
+        self.assertEqual(list(entries.values_list('pub_date', flat=True)),
+                         [new_post.pub_date])
+
 
 class PaginatorViewsTest(TestCase):
 
@@ -445,3 +598,211 @@ class PaginatorViewsTest(TestCase):
                              POSTS_ON_LAST_PAGE,
                              ('Количество записей на последней странице'
                               f' должно быть = {POSTS_ON_LAST_PAGE}'))
+
+    def test_cursor_navigation(self):
+        """Проверка переходов по курсорам следующей и предыдущей страниц."""
+        url = reverse('posts:index')
+        first_page = self.auth_client.get(url).context['page_obj']
+        next_cursor = first_page.paginator.next_cursor
+        self.assertIsNotNone(next_cursor, 'Нет курсора следующей страницы')
+
+        second_page = self.auth_client.get(
+            url, {'cursor': next_cursor}
+        ).context['page_obj']
+        self.assertEqual(second_page.number, NUMBER_LAST_PAGE)
+        self.assertEqual(len(second_page), POSTS_ON_LAST_PAGE)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(set(first_page).isdisjoint(second_page),
+                        'Записи страниц не должны повторяться')
+
+        previous_page = self.auth_client.get(
+            url, {'cursor': second_page.paginator.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(previous_page.number, 1)
+        self.assertEqual(list(previous_page), list(first_page))
+
+    def test_last_page_cursor(self):
+        """Проверка, что последняя страница читается с конца без OFFSET."""
+        url = reverse('posts:index')
+        first_page = self.auth_client.get(url).context['page_obj']
+        last_cursor = first_page.paginator.last_cursor
+        self.assertIsNotNone(last_cursor, 'Нет курсора последней страницы')
+
+        with CaptureQueriesContext(connection) as queries:
+            last_page = self.auth_client.get(
+                url, {'cursor': last_cursor}
+            ).context['page_obj']
+            rows = list(last_page)
+        self.assertEqual(last_page.number, NUMBER_LAST_PAGE)
+        self.assertEqual(len(rows), POSTS_ON_LAST_PAGE)
+        self.assertFalse(last_page.has_next())
+        self.assertIsNone(last_page.paginator.last_cursor)
+        self.assertTrue(set(first_page).isdisjoint(rows))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries))
+
+        previous_page = self.auth_client.get(
+            url, {'cursor': last_page.paginator.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+
+    def test_follow_index_cursor(self):
+        """Проверка листания ленты подписок по колонкам записей ленты."""
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.user)
+        client = Client()
+        client.force_login(follower)
+        url = reverse('posts:follow_index')
+        first_page = client.get(url).context['page_obj']
+
+        with CaptureQueriesContext(connection) as queries:
+            second_page = client.get(
+                url, {'cursor': first_page.paginator.next_cursor}
+            ).context['page_obj']
+            rows = list(second_page)
+        self.assertEqual(len(rows), POSTS_ON_LAST_PAGE)
+        self.assertTrue(set(first_page).isdisjoint(rows))
+        page_query = next(query['sql'] for query in queries
+                          if 'ORDER BY' in query['sql']
+                          and 'posts_timelineentry' in query['sql'])
+        self.assertEqual(page_query.count('JOIN "posts_timelineentry"'), 1)
+        self.assertIn('ORDER BY "timeline_date" DESC, "timeline_post" DESC',
+                      page_query)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {page_query}')
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('timeline_user_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Проверка, что испорченный курсор ведет на первую страницу."""
+        response = self.auth_client.get(reverse('posts:index'),
+                                        {'cursor': 'broken'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(len(response.context['page_obj']),
+                         settings.POSTS_ON_PAGE)
+
+    def test_page_window_is_bounded(self):
+        """Проверка, что паджинатор выводит только соседние страницы."""
+        Post.objects.bulk_create(
+            Post(text=f'Дополнительный пост {i}', author=self.user)
+            for i in range(settings.POSTS_ON_PAGE * 10)
+        )
+        response = self.auth_client.get(reverse('posts:index'),
+                                        {'page': 5})
+        paginator = response.context['page_obj'].paginator
+        self.assertEqual(
+            list(paginator.page_window),
+            list(range(5 - settings.PAGINATOR_WINDOW,
+                       5 + settings.PAGINATOR_WINDOW + 1))
+        )
+
+    def test_post_count_cache_follows_signals(self):
+        """Проверка поддержки закэшированного счетчика всех записей."""
+        key = count_key('posts')
+        response = self.auth_client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         COUNT_POSTS)
+
+        post = Post.objects.create(text='Новый пост', author=self.user)
+        self.assertEqual(cache.get(key), COUNT_POSTS + 1)
+
+        post.delete()
+        self.assertEqual(cache.get(key), COUNT_POSTS)
+
+    def test_group_counter_follows_signals(self):
+        """Проверка денормализованного счетчика записей группы."""
+        stats.recount_groups()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, COUNT_POSTS)
+
+        post = Post.objects.create(text='Новый пост', author=self.user,
+                                   group=self.group)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, COUNT_POSTS + 1)
+
+        post = Post.objects.get(pk=post.pk)
+        post.group = None
+        post.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, COUNT_POSTS)
+
+
+@override_settings(AUTHORS_ON_PAGE=2)
+class AuthorsInfoTest(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'author_{i}')
+                      for i in range(5)]
+        for i, user in enumerate(self.users):
+            Post.objects.bulk_create(
+                Post(text=f'Пост {j}', author=user) for j in range(i)
+            )
+        stats.recount_users()
+        self.client = Client()
+        cache.clear()
+
+    def test_authors_sorted_by_posts(self):
+        """Проверка сортировки авторов по числу постов."""
+        response = self.client.get(reverse('posts:authors_info'),
+                                   {'sort': 'posts'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), self.users[:2:-1])
+
+        response = self.client.get(
+            reverse('posts:authors_info'),
+            {'sort': 'posts', 'cursor': page_obj.paginator.next_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']),
+                         self.users[2:0:-1])
+
+    def test_authors_queries_do_not_grow(self):
+        """Проверка, что число запросов не зависит от числа авторов."""
+        url = reverse('posts:authors_info')
+        with self.assertNumQueries(3):
+            self.client.get(url, {'sort': 'followers'})
+        with self.assertNumQueries(0):
+            self.client.get(url, {'sort': 'followers'})
+
+
+@override_settings(COMMENTS_ON_PAGE=3)
+class CommentsPaginationTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth_user')
+        self.post = Post.objects.create(text='Тестовый текст',
+                                        author=self.user)
+        for i in range(5):
+            Comment.objects.create(post=self.post,
+                                   author=self.user,
+                                   text=f'Комментарий {i}')
+        self.client = Client()
+
+    def test_post_detail_paginates_comments(self):
+        """Проверка, что на странице поста выводится одна страница."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual([comment.text for comment in comments],
+                         ['Комментарий 4', 'Комментарий 3', 'Комментарий 2'])
+        self.assertTrue(comments.has_next())
+
+    def test_comments_json_next_page(self):
+        """Проверка подгрузки следующей страницы комментариев."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        first = self.client.get(url).json()
+        with self.assertNumQueries(2):
+            second = self.client.get(
+                url, {'cursor': first['next_cursor']}
+            ).json()
+        self.assertEqual([item['text'] for item in second['comments']],
+                         ['Комментарий 1', 'Комментарий 0'])
+        self.assertIsNone(second['next_cursor'])
+        self.assertIn('Комментарий 0', second['html'])
+
+    def test_comments_json_unknown_post(self):
+        """Проверка ответа 404 для несуществующего поста."""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
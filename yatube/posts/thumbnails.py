@@ -0,0 +1,509 @@
+"""
+Миниатюры картинок постов, которые готовятся заранее в фоновом пуле.
+
+Шаблоны вызывают {% thumbnail %} при рендеринге, и первый зритель
+страницы ждал, пока Pillow разберет и уменьшит оригиналы. Теперь
+миниатюры заказываются при сохранении поста, а пока задание
+не выполнено, бэкенд отдает заглушку того же размера.
+
+Каждая картинка нарезается в несколько ширин и, если Pillow умеет,
+в современные форматы. Размеры и имена вариантов известны заранее
+и записываются в Post.image_variants, так что шаблонам не нужно
+открывать файлы ради srcset и width/height.
+
+Соответствие картинок и миниатюр хранится в IndexKVStore: LRU
+в памяти процесса перед индексом в файле SQLite, без запроса
+к базе на каждый {% thumbnail %}.
+
+Готовность вариантов хранится в общем кэше, чтобы все процессы,
+а не только поставивший задание, отдавали заглушку, пока варианты
+готовятся, и оригинал, если создать их не удалось.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+from sorl.thumbnail.parsers import parse_geometry
+
+from utils.cache import bump_version
+from . import uploads
+
+logger = logging.getLogger('yatube.thumbnails')
+
+# Основной размер картинки поста; он же — запасной {% thumbnail %}
+# в posts/includes/post_picture.html для постов без вариантов.
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_SIZES = f'(max-width: {POST_IMAGE_SIZE[0]}px) 100vw, ' \
+                   f'{POST_IMAGE_SIZE[0]}px'
+# Компактные форматы в порядке предпочтения; JPEG понимают все.
+MODERN_FORMATS = ('AVIF', 'WEBP')
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+
+
+def supported_formats():
+    """Форматы, которые умеют записывать и Pillow, и sorl-thumbnail."""
+    Image.init()
+    return (*(image_format for image_format in MODERN_FORMATS
+              if image_format in Image.SAVE and image_format in EXTENSIONS),
+            'JPEG')
+
+
+def variant_size(width):
+    return width, round(width * POST_IMAGE_SIZE[1] / POST_IMAGE_SIZE[0])
+
+
+POST_IMAGE_FORMATS = supported_formats()
+# Миниатюра для постов, сохраненных до появления вариантов.
+FALLBACK_THUMBNAIL = ('{}x{}'.format(*POST_IMAGE_SIZE),
+                      {'crop': 'center', 'upscale': True})
+POST_THUMBNAILS = tuple(
+    ('{}x{}'.format(*variant_size(width)),
+     {'crop': 'center', 'upscale': True, 'format': image_format})
+    for image_format in POST_IMAGE_FORMATS
+    for width in POST_IMAGE_WIDTHS
+)
+
+# Состояния вариантов картинки в общем кэше.
+READY = 'ready'
+PENDING = 'pending'
+FAILED = 'failed'
+
+_executor = None
+_pending = {}
+_lock = threading.RLock()
+# Задания, поставленные текущим потоком во время обработки запроса.
+_scheduled = threading.local()
+
+
+class IndexKVStore(KVStoreBase):
+    """
+    Хранилище соответствий sorl-thumbnail: LRU перед индексом SQLite.
+
+    Ключи строятся из имен файлов, а загруженные файлы не перезаписываются,
+    поэтому записи LRU не устаревают: сменившаяся картинка — это новый
+    ключ, а записи старой удаляются через delete.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lru = OrderedDict()
+        self._lru_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # Соединение на поток и путь: THUMBNAIL_INDEX меняется в тестах.
+        path = settings.THUMBNAIL_INDEX
+        connections = self._local.__dict__.setdefault('connections', {})
+        connection = connections.get(path)
+        if connection is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection = sqlite3.connect(path, timeout=5,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS kvstore ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+            )
+            connections[path] = connection
+        return connection
+
+    def _remember(self, items):
+        with self._lru_lock:
+            for key, value in items:
+                self._lru[key] = value
+                self._lru.move_to_end(key)
+            while len(self._lru) > settings.THUMBNAIL_INDEX_LRU_SIZE:
+                self._lru.popitem(last=False)
+
+    def _forget(self, keys=None):
+        with self._lru_lock:
+            if keys is None:
+                self._lru.clear()
+            for key in keys or ():
+                self._lru.pop(key, None)
+
+    def get_many_raw(self, keys):
+        """Значения ключей одним запросом к индексу, с подгрузкой в LRU."""
+        found = {}
+        with self._lru_lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+        missing = [key for key in keys if key not in found]
+        if missing:
+            placeholders = ','.join('?' * len(missing))
+            rows = self.connection.execute(
+                f'SELECT key, value FROM kvstore '
+                f'WHERE key IN ({placeholders})',
+                missing
+            ).fetchall()
+            self._remember(rows)
+            found.update(rows)
+        return found
+
+    def _get_raw(self, key):
+        return self.get_many_raw([key]).get(key)
+
+    def _set_raw(self, key, value):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO kvstore (key, value) VALUES (?, ?)',
+            [key, value]
+        )
+        self._remember([(key, value)])
+
+    def _delete_raw(self, *keys):
+        self.connection.executemany('DELETE FROM kvstore WHERE key = ?',
+                                    [[key] for key in keys])
+        self._forget(keys)
+
+    def _find_keys_raw(self, prefix):
+        rows = self.connection.execute(
+            'SELECT key FROM kvstore WHERE substr(key, 1, ?) = ?',
+            [len(prefix), prefix]
+        )
+        return [key for (key,) in rows]
+
+
+@receiver(setting_changed)
+def forget_index(setting, **kwargs):
+    if setting in ('MEDIA_ROOT', 'THUMBNAIL_INDEX'):
+        store = default.kvstore
+        if hasattr(store, '_forget'):
+            store._forget()
+
+
+def forget(name, variants=''):
+    """
+    Удаляет миниатюры картинки и записи о них: картинку сменили.
+
+    Воркеры создают файлы вариантов мимо kvstore, поэтому они
+    удаляются по именам из image_variants, а без них — по describe.
+    """
+    default.kvstore.delete(ImageFile(name))
+    storage = default.storage
+    for variant in json.loads(variants or describe(name)):
+        storage.delete(variant['name'])
+    cache.delete(state_key(name))
+
+
+def state_key(name):
+    return f'thumbnails:state:{name}'
+
+
+def set_state(name, state):
+    """Сообщает всем процессам, готовы ли варианты картинки."""
+    # Готовые варианты не меняются; остальные состояния пересматриваются:
+    # процесс с заданием мог завершиться, не дописав файлы.
+    timeout = None if state == READY else settings.THUMBNAIL_STATE_TIMEOUT
+    cache.set(state_key(name), state, timeout)
+
+
+def load_states(posts):
+    """
+    Состояния вариантов картинок постов одним запросом к кэшу.
+
+    Если состояния в кэше нет, готовность проверяется по файлу
+    последнего варианта — задание создает их по порядку — и запоминается.
+    """
+    posts = [post for post in posts
+             if post.image and post.image_variants
+             and not hasattr(post, '_thumbnail_state')]
+    keys = {post.pk: state_key(post.image.name) for post in posts}
+    states = cache.get_many(keys.values())
+    found = {}
+    for post in posts:
+        state = states.get(keys[post.pk])
+        if state is None:
+            variants = json.loads(post.image_variants)
+            exists = default.storage.exists(variants[-1]['name'])
+            state = found[keys[post.pk]] = READY if exists else FAILED
+        post._thumbnail_state = state
+    for key, state in found.items():
+        cache.set(key, state, None if state == READY
+                  else settings.THUMBNAIL_STATE_TIMEOUT)
+
+
+def get_state(post):
+    load_states([post])
+    return post._thumbnail_state
+
+
+def describe(name):
+    """
+    Варианты картинки: имя файла, формат и размеры каждой миниатюры.
+
+    При обрезке с увеличением размер миниатюры равен запрошенному,
+    поэтому описание строится без чтения файла.
+    """
+    backend = AsyncThumbnailBackend()
+    variants = []
+    for geometry_string, options in POST_THUMBNAILS:
+        width, height = parse_geometry(geometry_string)
+        variants.append({
+            'name': backend.thumbnail_name(name, geometry_string, options),
+            'format': options['format'],
+            'width': width,
+            'height': height,
+        })
+    return json.dumps(variants)
+
+
+def picture(post):
+    """
+    Данные для <picture>: source по форматам и запасной JPEG.
+
+    None, если у поста нет записанных вариантов. Пока варианты
+    готовятся, отдается заглушка, а если создать их не удалось —
+    ссылка на оригинал.
+    """
+    if not post.image_variants:
+        return None
+    state = get_state(post)
+    if state == PENDING:
+        placeholder = PendingThumbnail('{}x{}'.format(*POST_IMAGE_SIZE))
+        return {'placeholder': placeholder}
+    if state == FAILED:
+        return {'original': post.image.url}
+    variants = json.loads(post.image_variants)
+    storage = default.storage
+    srcsets = {}
+    fallback = None
+    for variant in variants:
+        url = storage.url(variant['name'])
+        srcsets.setdefault(variant['format'], []).append(
+            f'{url} {variant["width"]}w'
+        )
+        if (variant['format'] == 'JPEG'
+                and variant['width'] == POST_IMAGE_SIZE[0]):
+            fallback = dict(variant, url=url)
+    return {
+        'sources': [
+            {'type': MIME_TYPES[image_format], 'srcset': ', '.join(srcset)}
+            for image_format, srcset in srcsets.items()
+            if image_format != 'JPEG'
+        ],
+        'srcset': ', '.join(srcsets.get('JPEG', ())),
+        'sizes': POST_IMAGE_SIZES,
+        'fallback': fallback,
+    }
+
+
+def is_pending(post):
+    """Не готовы ли еще миниатюры картинки поста."""
+    if not post.image:
+        return False
+    if not post.image_variants:
+        # Имя запасной миниатюры без расчета неизвестно.
+        return bool(_pending)
+    return get_state(post) != READY
+
+
+def prefetch(posts):
+    """
+    Загружает миниатюры картинок постов в LRU одним запросом.
+
+    Нужно только постам без вариантов: их картинка идет через
+    {% thumbnail %}, остальным хватает Post.image_variants
+    и состояния вариантов из кэша.
+    """
+    load_states(posts)
+    store = default.kvstore
+    if not hasattr(store, 'get_many_raw'):
+        return
+    backend = AsyncThumbnailBackend()
+    geometry_string, options = FALLBACK_THUMBNAIL
+    keys = [
+        add_prefix(backend.prepare(post.image, geometry_string,
+                                   options)[2].key)
+        for post in posts if post.image and not post.image_variants
+    ]
+    if keys:
+        store.get_many_raw(keys)
+
+
+class PendingThumbnail:
+    """Заглушка миниатюры, пока та готовится в фоне."""
+
+    def __init__(self, geometry_string):
+        self.width, self.height = parse_geometry(geometry_string)
+        self.height = self.height or self.width
+
+    @property
+    def url(self):
+        svg = (f'<svg xmlns="http://www.w3.org/2000/svg" '
+               f'width="{self.width}" height="{self.height}">'
+               f'<rect width="100%" height="100%" fill="#e9ecef"/></svg>')
+        return f'data:image/svg+xml,{quote(svg)}'
+
+    def __bool__(self):
+        return True
+
+
+class AsyncThumbnailBackend(ThumbnailBackend):
+    """
+    Бэкенд sorl-thumbnail, не блокирующий рендеринг на заказанных
+    миниатюрах: пока задание в очереди, возвращается PendingThumbnail.
+    """
+
+    def prepare(self, file_, geometry_string, options):
+        """Источник, полные опции и файл миниатюры, как в ThumbnailBackend."""
+        source = ImageFile(file_)
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return source, options, ImageFile(name, default.storage)
+
+    def thumbnail_name(self, file_, geometry_string, options):
+        return self.prepare(file_, geometry_string, options)[2].name
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if file_ and _pending:
+            name = self.thumbnail_name(file_, geometry_string, options)
+            if name in _pending:
+                return PendingThumbnail(geometry_string)
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+    def create_file(self, file_, geometry_string, **options):
+        """
+        Записывает файл миниатюры в хранилище, не трогая kvstore.
+
+        Без обращений к базе задание безопасно выполнять в любом потоке,
+        а запись в kvstore сделает первый же рендеринг: файл уже есть,
+        и get_thumbnail только запомнит его.
+        """
+        source, options, thumbnail = self.prepare(file_, geometry_string,
+                                                  options)
+        if thumbnail.exists():
+            return thumbnail
+        source_image = default.engine.get_image(source)
+        try:
+            options['image_info'] = default.engine.get_image_info(
+                source_image
+            )
+            self._create_thumbnail(source_image, geometry_string, options,
+                                   thumbnail)
+            self._create_alternative_resolutions(source_image,
+                                                 geometry_string, options,
+                                                 thumbnail.name)
+        finally:
+            default.engine.cleanup(source_image)
+        return thumbnail
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+        return _executor
+
+
+def create_files(name):
+    """
+    Приводит картинку и создает файлы всех ее миниатюр; False при ошибке.
+    """
+    backend = AsyncThumbnailBackend()
+    try:
+        uploads.normalize(name)
+        for geometry_string, options in POST_THUMBNAILS:
+            backend.create_file(name, geometry_string, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', name)
+        return False
+    return True
+
+
+def register(name):
+    """Запоминает готовые миниатюры картинки в kvstore."""
+    for geometry_string, options in POST_THUMBNAILS:
+        default.backend.get_thumbnail(name, geometry_string, **options)
+
+
+def _run(name, names, scopes):
+    created = False
+    try:
+        created = create_files(name)
+    finally:
+        set_state(name, READY if created else FAILED)
+        with _lock:
+            for thumbnail in names:
+                _pending.pop(thumbnail, None)
+        if scopes:
+            # Закэшированные списки и ETag страниц показывают заглушку.
+            bump_version(*scopes)
+
+
+def schedule(name, scopes=()):
+    """
+    Ставит картинку в очередь на создание миниатюр.
+
+    Когда задание выполнено, версии областей кэша scopes меняются.
+    При THUMBNAIL_WORKERS = 0 миниатюры создаются сразу.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        uploads.normalize(name)
+        register(name)
+        set_state(name, READY)
+        return None
+    backend = AsyncThumbnailBackend()
+    names = [backend.thumbnail_name(name, geometry_string, options)
+             for geometry_string, options in POST_THUMBNAILS]
+    with _lock:
+        if all(thumbnail in _pending for thumbnail in names):
+            return _pending[names[0]]
+        set_state(name, PENDING)
+        future = get_executor().submit(_run, name, names, scopes)
+        for thumbnail in names:
+            _pending.setdefault(thumbnail, future)
+    _scheduled.__dict__.setdefault('futures', []).append(future)
+    return future
+
+
+def wait_scheduled():
+    """
+    Дожидается миниатюр, заказанных в текущем запросе.
+
+    Вызывается по request_finished, когда ответ уже отдан клиенту.
+    При THUMBNAIL_WAIT_TIMEOUT = 0 воркер сразу берет следующий запрос,
+    иначе ждет свои задания не дольше таймаута: так очередь не растет
+    без предела, но и воркер не простаивает.
+    """
+    futures = _scheduled.__dict__.pop('futures', ())
+    timeout = settings.THUMBNAIL_WAIT_TIMEOUT
+    if futures and timeout:
+        wait(futures, timeout=timeout)
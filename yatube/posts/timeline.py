@@ -0,0 +1,176 @@
+"""
+Лента подписок с раздачей записей при публикации (fan-out on write).
+
+Новая запись автора копируется в ленты его подписчиков, поэтому
+follow_index читает готовую ленту вместо соединения Follow и Post.
+Записи авторов, у которых подписчиков не меньше
+TIMELINE_FANOUT_THRESHOLD, не раздаются, а добавляются при чтении.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+CELEBRITIES_CACHE_KEY = 'timeline:celebrities'
+# Порядок ленты совпадает с индексом (user, -pub_date, -post)
+# записей ленты, поэтому страница читается без сортировки.
+TIMELINE_ORDERING = ('-timeline_date', '-timeline_post')
+
+_executor = None
+_lock = threading.Lock()
+
+
+def followers_count(author_id):
+    return UserStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+
+
+def is_celebrity(author_id):
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    return bool(threshold) and followers_count(author_id) >= threshold
+
+
+def celebrity_ids():
+    """Авторы, чьи записи добавляются в ленту при чтении."""
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    if not threshold:
+        return set()
+    ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if ids is None:
+        ids = set(
+            UserStats.objects.filter(followers_count__gte=threshold)
+            .values_list('user_id', flat=True)
+        )
+        cache.set(CELEBRITIES_CACHE_KEY, ids,
+                  settings.TIMELINE_CELEBRITIES_TIMEOUT)
+    return ids
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out(post):
+    """Раздает новую запись подписчикам автора."""
+    if is_celebrity(post.author_id):
+        cache.delete(CELEBRITIES_CACHE_KEY)
+        return
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.id,
+                      pub_date=post.pub_date)
+        for user_id in Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True).iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все записи автора."""
+    if is_celebrity(author_id):
+        # Подписка могла сделать автора знаменитостью: без него в списке
+        # новый подписчик не увидит его записей, пока список не истечет.
+        cache.delete(CELEBRITIES_CACHE_KEY)
+        return
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in Post.objects.filter(author_id=author_id)
+        .values_list('id', 'pub_date').iterator()
+    )
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TIMELINE_WORKERS,
+                thread_name_prefix='timeline'
+            )
+        return _executor
+
+
+def defer(function, *args):
+    """
+    Выполняет задание ленты после фиксации транзакции в фоне.
+
+    При TIMELINE_WORKERS = 0 задание выполняется сразу после фиксации.
+    """
+    if not settings.TIMELINE_WORKERS:
+        transaction.on_commit(lambda: function(*args))
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(_run, function, *args)
+    )
+
+
+def _run(function, *args):
+    try:
+        function(*args)
+    finally:
+        close_old_connections()
+
+
+def restore(author_id):
+    """Раскладывает записи бывшей знаменитости по лентам подписчиков."""
+    if is_celebrity(author_id):
+        return
+    for user_id in Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True):
+        backfill(user_id, author_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты записи автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id
+    ).delete()
+    threshold = settings.TIMELINE_FANOUT_THRESHOLD
+    if threshold and followers_count(author_id) == threshold - 1:
+        # Автор перестал быть знаменитостью: его записи,
+        # опубликованные без раздачи, нужно разложить по лентам.
+        # Подписчиков может быть много, поэтому отписка их не ждет.
+        cache.delete(CELEBRITIES_CACHE_KEY)
+        defer(restore, author_id)
+
+
+def rebuild(user_id):
+    """Пересобирает ленту пользователя по текущим подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    for author_id in Follow.objects.filter(
+            user_id=user_id).values_list('author_id', flat=True):
+        backfill(user_id, author_id)
+
+
+def timeline_posts(user):
+    """
+    Записи ленты подписок пользователя для листания в TIMELINE_ORDERING.
+    """
+    posts = Post.objects.select_related('author', 'group')
+    celebrities = celebrity_ids()
+    followed_celebrities = []
+    if celebrities:
+        followed_celebrities = list(
+            Follow.objects.filter(user=user, author_id__in=celebrities)
+            .values_list('author_id', flat=True)
+        )
+    if not followed_celebrities:
+        # Аннотации используют то же соединение, что и фильтр по
+        # подписчику, и курсор сравнивает колонки записи ленты.
+        return posts.filter(timeline_entries__user=user).annotate(
+            timeline_date=F('timeline_entries__pub_date'),
+            timeline_post=F('timeline_entries__post_id'),
+        )
+    return posts.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=followed_celebrities)
+    ).annotate(timeline_date=F('pub_date'), timeline_post=F('id'))
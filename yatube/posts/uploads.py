@@ -0,0 +1,360 @@
+"""
+Загрузка картинок постов с ограничениями, проверяемыми по ходу чтения.
+
+Обработчик пишет файл на диск частями, поэтому память не зависит
+от размера и числа одновременных загрузок. Сигнатура формата
+проверяется по первой части, лимит байт — по каждой; превысивший
+лимит файл дальше не пишется, а форма сообщает об ошибке.
+Метаданные (GPS и прочий EXIF) убираются до записи файла
+в хранилище: оригинал сразу раздается из MEDIA_URL. Для этого
+из файла вырезаются блоки метаданных без декодирования пикселей,
+а поворот по EXIF и уменьшение до POST_IMAGE_MAX_SIDE выполняет
+фоновый пул миниатюр.
+"""
+import os
+import shutil
+import struct
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Сигнатуры разрешенных форматов: (смещение, байты).
+SIGNATURES = {
+    'JPEG': ((0, b'\xff\xd8\xff'),),
+    'PNG': ((0, b'\x89PNG\r\n\x1a\n'),),
+    'GIF': ((0, b'GIF87a'), (0, b'GIF89a')),
+    'WEBP': ((0, b'RIFF'), (8, b'WEBP')),
+}
+SIGNATURE_SIZE = 12
+JPEG_QUALITY = 85
+# Метаданные в Image.info; EXIF проверяется отдельно, через getexif().
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp')
+ORIENTATION = 0x0112
+# Сегменты JPEG, которые остаются: JFIF (APP0), ICC-профиль и MPF
+# (APP2), Adobe (APP14) влияют на вывод; остальные APPn и комментарии
+# несут EXIF, XMP, IPTC и прочие метаданные.
+JPEG_KEPT_SEGMENTS = {0xE0, 0xE2, 0xEE}
+# Блоки PNG с текстом, EXIF и временем изменения.
+PNG_METADATA_CHUNKS = {b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+# Блоки WebP с метаданными и их флаги в заголовке VP8X.
+WEBP_METADATA_CHUNKS = {b'EXIF': 0x08, b'XMP ': 0x04}
+
+
+def sniff_format(header):
+    """Формат картинки по первым байтам файла или None."""
+    for image_format, parts in SIGNATURES.items():
+        if image_format == 'WEBP':
+            matched = all(header[offset:offset + len(part)] == part
+                          for offset, part in parts)
+        else:
+            matched = any(header[offset:offset + len(part)] == part
+                          for offset, part in parts)
+        if matched:
+            return image_format
+    return None
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Потоковая загрузка во временный файл с лимитом POST_IMAGE_MAX_BYTES
+    и проверкой сигнатуры формата.
+
+    Отвергнутый файл все равно возвращается, но с атрибутом
+    upload_error: так форма может показать понятную ошибку. Обработчик
+    общий для всех форм, поэтому ошибку проверяет и Post.clean,
+    а сохранить такой файл не дает сигнал pre_save.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            limit = filesizeformat(settings.POST_IMAGE_MAX_BYTES)
+            self.error = f'Файл больше {limit}'
+            return None
+        if len(self.header) < SIGNATURE_SIZE:
+            self.header += raw_data[:SIGNATURE_SIZE - len(self.header)]
+            if (len(self.header) >= SIGNATURE_SIZE
+                    and sniff_format(self.header) is None):
+                self.error = ('Поддерживаются картинки JPEG, PNG, GIF '
+                              'и WebP')
+                return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not self.error and sniff_format(self.header) is None:
+            self.error = 'Поддерживаются картинки JPEG, PNG, GIF и WebP'
+        uploaded = super().file_complete(file_size)
+        uploaded.upload_error = self.error
+        return uploaded
+
+
+def upload_error(image):
+    """Ошибка загрузки еще не сохраненного файла поля или None."""
+    if not image or image._committed:
+        return None
+    return getattr(image.file, 'upload_error', None)
+
+
+def check_image(image):
+    """
+    Проверка картинки по заголовку, уже разобранному ImageField.
+
+    Pillow читает размеры без декодирования пикселей, так что лимит
+    POST_IMAGE_MAX_PIXELS отсекает «бомбы» до любой обработки.
+    Возвращает текст ошибки или None.
+    """
+    if image.format not in SIGNATURES:
+        return 'Поддерживаются картинки JPEG, PNG, GIF и WebP'
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        return (f'Картинка {width}×{height} слишком велика: не больше '
+                f'{settings.POST_IMAGE_MAX_PIXELS // 1_000_000} Мп')
+    return None
+
+
+def _replace(name, image, image_format, **params):
+    """Перезаписывает файл хранилища, не оставляя его недописанным."""
+    if hasattr(default_storage, 'path'):
+        path = default_storage.path(name)
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix='.tmp'
+        )
+        try:
+            with os.fdopen(descriptor, 'wb') as output:
+                image.save(output, image_format, **params)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return
+    with default_storage.open(name, 'wb') as output:
+        image.save(output, image_format, **params)
+
+
+def has_metadata(image):
+    return bool(image.getexif()) or any(key in image.info
+                                        for key in METADATA_KEYS)
+
+
+def _prepare(image, max_side=None):
+    """
+    Картинка без метаданных, повернутая по EXIF и, если задан max_side,
+    уменьшенная; и параметры для ее сохранения в исходном формате.
+    """
+    image_format = image.format
+    image.load()
+    image = ImageOps.exif_transpose(image)
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    params = {}
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        params = {'quality': JPEG_QUALITY, 'optimize': True}
+    # JPEG и WebP пишут EXIF, только если его передали явно,
+    # а PNG берет его из info: убираем метаданные оттуда.
+    for key in METADATA_KEYS:
+        image.info.pop(key, None)
+    return image, params
+
+
+def _read(source, size):
+    data = source.read(size)
+    if len(data) != size:
+        raise ValueError('Файл картинки обрезан')
+    return data
+
+
+def _copy(source, output, size):
+    shutil.copyfileobj(_Limited(source, size), output)
+
+
+class _Limited:
+    """Не больше size байт из source: для copyfileobj."""
+
+    def __init__(self, source, size):
+        self.source = source
+        self.left = size
+
+    def read(self, size=-1):
+        if size < 0 or size > self.left:
+            size = self.left
+        data = _read(self.source, size)
+        self.left -= size
+        return data
+
+
+def _orientation_segment(orientation):
+    exif = Image.Exif()
+    exif[ORIENTATION] = orientation
+    data = exif.tobytes()
+    return b'\xff\xe1' + struct.pack('>H', len(data) + 2) + data
+
+
+def _strip_jpeg(source, output, orientation):
+    """
+    Копирует JPEG без сегментов метаданных; поток сжатых данных после
+    SOS переносится как есть. Поворот сохраняется в EXIF из одного тега
+    сразу после JFIF.
+    """
+    output.write(_read(source, 2))
+    exif = _orientation_segment(orientation) if orientation else b''
+    stripped = False
+    while True:
+        prefix, marker = _read(source, 2)
+        while marker == 0xFF:
+            marker = _read(source, 1)[0]
+        if prefix != 0xFF:
+            raise ValueError('Неверный маркер JPEG')
+        if marker != 0xE0 and exif:
+            output.write(exif)
+            exif = b''
+        if marker in (0xDA, 0xD9) or 0xD0 <= marker <= 0xD7:
+            output.write(bytes((0xFF, marker)))
+            if marker == 0xDA:
+                shutil.copyfileobj(source, output)
+                return stripped
+            continue
+        length = _read(source, 2)
+        size = struct.unpack('>H', length)[0] - 2
+        if marker == 0xFE or (0xE0 <= marker <= 0xEF
+                              and marker not in JPEG_KEPT_SEGMENTS):
+            source.seek(size, os.SEEK_CUR)
+            stripped = True
+            continue
+        output.write(bytes((0xFF, marker)) + length)
+        _copy(source, output, size)
+
+
+def _strip_png(source, output, orientation):
+    """Копирует PNG без текстовых блоков, eXIf и tIME."""
+    output.write(_read(source, 8))
+    stripped = False
+    while True:
+        header = source.read(8)
+        if not header:
+            return stripped
+        size = struct.unpack('>I', header[:4])[0]
+        if header[4:] in PNG_METADATA_CHUNKS:
+            source.seek(size + 4, os.SEEK_CUR)
+            stripped = True
+            continue
+        output.write(header)
+        # Данные и CRC блока.
+        _copy(source, output, size + 4)
+
+
+def _strip_webp(source, output, orientation):
+    """Копирует WebP без блоков EXIF и XMP, исправляя флаги и размер."""
+    output.write(_read(source, 12))
+    stripped = False
+    while True:
+        header = source.read(8)
+        if not header:
+            break
+        fourcc = header[:4]
+        size = struct.unpack('<I', header[4:])[0]
+        padded = size + size % 2
+        if fourcc in WEBP_METADATA_CHUNKS:
+            source.seek(padded, os.SEEK_CUR)
+            stripped = True
+            continue
+        output.write(header)
+        if fourcc == b'VP8X':
+            # Флаги в первом байте: блоков метаданных больше не будет.
+            data = bytearray(_read(source, padded))
+            for flag in WEBP_METADATA_CHUNKS.values():
+                data[0] &= ~flag
+            output.write(data)
+        else:
+            _copy(source, output, padded)
+    end = output.tell()
+    output.seek(4)
+    output.write(struct.pack('<I', end - 8))
+    output.seek(end)
+    return stripped
+
+
+STRIPPERS = {
+    'JPEG': _strip_jpeg,
+    'PNG': _strip_png,
+    'WEBP': _strip_webp,
+}
+
+
+def strip_metadata(upload):
+    """
+    Убирает метаданные из загруженного, еще не сохраненного файла.
+    Возвращает True, если файл перезаписан.
+
+    Пиксели не декодируются: блоки метаданных вырезаются при
+    копировании, так что время зависит только от размера файла.
+    Поворот из EXIF остается единственным тегом, его применит
+    normalize в фоне. GIF не трогаем: EXIF в GIF не бывает.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    image_format = image.format
+    strip = STRIPPERS.get(image_format)
+    if strip is None:
+        upload.seek(0)
+        return False
+    orientation = image.getexif().get(ORIENTATION)
+    with tempfile.TemporaryFile() as output:
+        upload.seek(0)
+        try:
+            stripped = strip(upload, output,
+                             orientation if orientation != 1 else None)
+        except (ValueError, struct.error):
+            # Разметку не разобрать: пересохраняем картинку целиком.
+            output.seek(0)
+            output.truncate()
+            upload.seek(0)
+            image, params = _prepare(Image.open(upload))
+            image.save(output, image_format, **params)
+            stripped = True
+        if not stripped:
+            upload.seek(0)
+            return False
+        output.seek(0)
+        upload.seek(0)
+        upload.truncate()
+        shutil.copyfileobj(output, upload)
+    upload.size = upload.tell()
+    upload.flush()
+    upload.seek(0)
+    return True
+
+
+def normalize(name):
+    """
+    Уменьшает сохраненную картинку до POST_IMAGE_MAX_SIDE. Возвращает
+    True, если файл перезаписан.
+
+    strip_metadata оставляет у новых загрузок только поворот из EXIF:
+    он применяется здесь, и тег тоже удаляется. Картинки, загруженные
+    раньше, чистятся здесь же.
+    """
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    with default_storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image_format = image.format
+        oversized = max(image.size) > max_side
+        if not oversized and (image_format == 'GIF'
+                              or not has_metadata(image)):
+            return False
+        image, params = _prepare(image, max_side)
+    _replace(name, image, image_format, **params)
+    return True
@@ -11,6 +11,9 @@ urlpatterns = [
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/delete/', views.post_delete, name='post_delete'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
@@ -23,4 +26,11 @@ urlpatterns = [
          name='profile_unfollow'),
     path('authors/', views.authors_info, name='authors_info'),
     path('groups/', views.groups_info, name='groups_info'),
+    path('search/', views.search, name='search'),
+    path('profile/<username>/export/',
+         views.profile_export,
+         name='profile_export'),
+    path('group/<slug:slug>/export/',
+         views.group_export,
+         name='group_export'),
 ]
@@ -1,34 +1,64 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import (HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from .conditional import (conditional_page, group_scopes, index_scopes,
+                          post_scopes, profile_scopes)
+from .export import FORMATS
 from .forms import CommentForm, PostForm
+from .search import search_posts
+from .timeline import TIMELINE_ORDERING, timeline_posts
+from core.db import read_from_replica, stream_from_replica
+from utils.cache import get_version
+from utils.counting import count_key
 from utils.paginator import get_paginator
 
+COMMENTS_ORDERING = ('-created', '-id')
 
+AUTHORS_ORDERINGS = {
+    'name': ('username', 'id'),
+    'posts': ('-stats__posts_count', '-id'),
+    'followers': ('-stats__followers_count', '-id'),
+}
+
+
+@read_from_replica
+@conditional_page(index_scopes)
 def index(request):
     template = 'posts/index.html'
     posts = Post.objects.select_related('author', 'group').all()
-    page_obj = get_paginator(request, posts)
+    page_obj = get_paginator(request, posts, count_key=count_key('posts'))
     context = {
         'title': 'Последние обновления на сайте',
         'page_obj': page_obj,
+        'cache_version': get_version('index'),
+        'cache_timeout': settings.POST_LIST_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
 
+@read_from_replica
+@conditional_page(group_scopes)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author').all()
-    page_obj = get_paginator(request, posts)
+    page_obj = get_paginator(request, posts, count=group.posts_count)
     context = {
         'title': f'Записи сообщества {group}',
         'group': group,
         'page_obj': page_obj,
+        'cache_version': get_version(f'group:{group.id}'),
+        'cache_timeout': settings.POST_LIST_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
 
+@read_from_replica
 def groups_info(request):
     template = 'posts/groups_info.html'
     groups = Group.objects.all()
@@ -39,23 +69,38 @@ def groups_info(request):
     return render(request, template, context)
 
 
+@read_from_replica
 def authors_info(request):
     template = 'posts/authors_info.html'
-    all_authors = User.objects.all()
+    sort = request.GET.get('sort')
+    if sort not in AUTHORS_ORDERINGS:
+        sort = 'name'
+    authors = User.objects.select_related('stats').all()
+    page_obj = get_paginator(request,
+                             authors,
+                             AUTHORS_ORDERINGS[sort],
+                             count_key=count_key('users'),
+                             per_page=settings.AUTHORS_ON_PAGE)
     context = {
         'title': 'Все авторы',
-        'all_authors': all_authors,
+        'sort': sort,
+        'page_obj': page_obj,
+        'cache_timeout': settings.AUTHORS_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
 
+@read_from_replica
+@conditional_page(profile_scopes)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
     my_followings = User.objects.filter(following__user=author)
     my_followers = User.objects.filter(follower__author=author)
     posts = author.posts.select_related('author', 'group').all()
-    page_obj = get_paginator(request, posts)
+    page_obj = get_paginator(request, posts,
+                             count=author.stats.posts_count)
     following = (request.user.is_authenticated
                  and Follow.objects.filter(user=request.user,
                                            author=author).exists())
@@ -65,14 +110,49 @@ def profile(request, username):
         'my_followers': my_followers,
         'page_obj': page_obj,
         'following': following,
+        'cache_version': get_version(f'author:{author.id}'),
+        'cache_timeout': settings.POST_LIST_CACHE_TIMEOUT,
     }
     return render(request, template, context)
 
 
+@read_from_replica
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        posts, ordering = search_posts(
+            Post.objects.select_related('author', 'group'), query
+        )
+        page_obj = get_paginator(request, posts, ordering)
+    context = {
+        'title': 'Поиск записей',
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
+def get_comments_page(request, post_id):
+    comments = Comment.objects.select_related('author').filter(
+        post_id=post_id
+    )
+    return get_paginator(request,
+                         comments,
+                         COMMENTS_ORDERING,
+                         per_page=settings.COMMENTS_ON_PAGE)
+
+
+@read_from_replica
+@conditional_page(post_scopes)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post_choice = get_object_or_404(Post, pk=post_id)
-    comments = post_choice.comments.all()
+    post_choice = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
+    comments = get_comments_page(request, post_id)
     form = CommentForm()
     context = {
         'post_choice': post_choice,
@@ -82,6 +162,30 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+@read_from_replica
+def post_comments(request, post_id):
+    """Следующие страницы комментариев для подгрузки без перезагрузки."""
+    get_object_or_404(Post.objects.only('id'), pk=post_id)
+    comments = get_comments_page(request, post_id)
+    html = render_to_string('posts/includes/comment_list.html',
+                            {'comments': comments},
+                            request)
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.id,
+                'author': comment.author.username,
+                'author_name': comment.author.get_full_name(),
+                'text': comment.text,
+                'created': comment.created,
+            }
+            for comment in comments
+        ],
+        'html': html,
+        'next_cursor': comments.paginator.next_cursor,
+    })
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
@@ -98,7 +202,7 @@ def post_create(request):
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
     post = get_object_or_404(Post, pk=post_id)
-    if request.user != post.author:
+    if request.user.id != post.author_id:
         return redirect('posts:post_detail', post_id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None,
@@ -114,10 +218,10 @@ def post_edit(request, post_id):
 @login_required
 def post_delete(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
-    if request.user != post.author:
+    if request.user.id != post.author_id:
         return redirect('posts:post_detail', post_id)
     post.delete()
-    return redirect('posts:profile', post.author)
+    return redirect('posts:profile', request.user.username)
 
 
 @login_required
@@ -133,12 +237,11 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.select_related('author').filter(
-        author__following__user=request.user
-    )
-    page_obj = get_paginator(request, posts)
+    posts = timeline_posts(request.user)
+    page_obj = get_paginator(request, posts, TIMELINE_ORDERING)
     context = {
         'title': 'Мои подписки',
         'page_obj': page_obj
@@ -148,7 +251,8 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
     if author != request.user:
         Follow.objects.get_or_create(user=request.user, author=author)
     return redirect("posts:profile", username=username)
@@ -159,3 +263,39 @@ def profile_unfollow(request, username):
     Follow.objects.filter(user=request.user,
                           author__username=username).delete()
     return redirect("posts:profile", username=username)
+
+
+def export_response(request, posts, name):
+    """Потоковая выгрузка записей в формате из ?format=."""
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        return HttpResponseBadRequest(
+            f'Формат выгрузки: {", ".join(FORMATS)}'
+        )
+    export, content_type, extension = FORMATS[export_format]
+    chunks = export(posts)
+    # Тело читается после ReadYourWritesMiddleware, вне закрепления
+    # за основной базой, поэтому его нужно учесть здесь.
+    if not getattr(request, 'db_pinned', False):
+        chunks = stream_from_replica(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.{extension}"'
+    )
+    return response
+
+
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if author != request.user and not request.user.is_staff:
+        raise PermissionDenied
+    return export_response(request, author.posts.all(), author.username)
+
+
+@login_required
+def group_export(request, slug):
+    if not request.user.is_staff:
+        raise PermissionDenied
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(request, group.posts.all(), group.slug)
@@ -0,0 +1,94 @@
+"""
+Версии кэша для точечной инвалидации и защита от лавины пересчетов.
+
+Каждой области (главная страница, группа, автор) соответствует
+номер версии; ключи кэша фрагментов включают его, поэтому смена
+версии делает устаревшими только фрагменты этой области.
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_PREFIX = 'version'
+
+
+def _version_key(scope):
+    return f'{VERSION_PREFIX}:{scope}'
+
+
+def _new_version():
+    # Значение от времени, а не счетчик с единицы: после вытеснения
+    # ключа из кэша версия не повторит уже выданную ранее.
+    return time.time_ns()
+
+
+def get_version(*scopes):
+    """Общая версия нескольких областей для ключа кэша."""
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump_version(*scopes):
+    """Делает устаревшими фрагменты перечисленных областей."""
+    version = _new_version()
+    cache.set_many({_version_key(scope): version for scope in scopes}, None)
+
+
+def _lock_key(key):
+    return f'lock:{key}'
+
+
+def get_or_compute(key, compute, timeout, beta=None, backend=None,
+                   refresh=False):
+    """
+    Значение из кэша или результат compute() с защитой от лавины.
+
+    Пересчет выполняет один процесс: он берет блокировку через
+    cache.add, остальные тем временем отдают прежнее значение или ждут.
+    Чтобы горячий ключ не истекал у всех одновременно, значение
+    пересчитывается заранее с вероятностью, растущей к концу срока
+    (алгоритм XFetch), тем раньше, чем дольше длится compute().
+    С refresh значение пересчитывается и перезаписывается без чтения.
+    """
+    backend = backend or cache
+    beta = settings.CACHE_EARLY_RECOMPUTE_BETA if beta is None else beta
+    entry = None if refresh else backend.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        early = delta * beta * -math.log(1 - random.random())
+        if time.time() + early < expires:
+            return value
+
+    lock_key = _lock_key(key)
+    lock_timeout = settings.CACHE_LOCK_TIMEOUT
+    # Принудительный пересчет не ждет и не снимает чужую блокировку.
+    locked = not refresh and backend.add(lock_key, True, lock_timeout)
+    if not refresh and not locked:
+        if entry is not None:
+            return entry[0]
+        deadline = time.time() + lock_timeout
+        while time.time() < deadline:
+            time.sleep(settings.CACHE_LOCK_POLL)
+            entry = backend.get(key)
+            if entry is not None:
+                return entry[0]
+        # Владелец блокировки не успел: считаем сами, чем отдавать ошибку.
+
+    try:
+        started = time.time()
+        value = compute()
+        delta = time.time() - started
+        expires = math.inf if timeout is None else time.time() + timeout
+        backend.set(key, (value, expires, delta), timeout)
+    finally:
+        if not refresh:
+            backend.delete(lock_key)
+    return value
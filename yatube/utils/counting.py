@@ -0,0 +1,86 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+COUNT_PREFIX = 'count'
+
+
+def count_key(*parts):
+    """Ключ кэша для счетчика именованной выборки."""
+    return ':'.join(str(part) for part in (COUNT_PREFIX,) + parts)
+
+
+def _query_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+    return count_key('query', digest)
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по статистике планировщика.
+
+    Возвращает None, если выборка отфильтрована или статистики нет.
+    """
+    if queryset.query.where:
+        return None
+    table = queryset.model._meta.db_table
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [table]
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [table]
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    value = int(str(row[0]).split()[0])
+    return value if value >= 0 else None
+
+
+def cached_count(queryset, key=None):
+    """
+    Число строк выборки из кэша.
+
+    Для именованных выборок (key) значение поддерживается сигналами
+    через adjust_count, для прочих — живет COUNT_CACHE_TIMEOUT секунд.
+    Большие нефильтрованные таблицы считаются по статистике планировщика.
+    """
+    key = key or _query_key(queryset)
+    value = cache.get(key)
+    if value is None:
+        value = estimate_count(queryset)
+        if value is None or value < settings.COUNT_ESTIMATE_THRESHOLD:
+            value = queryset.count()
+        cache.set(key, value, settings.COUNT_CACHE_TIMEOUT)
+    return value
+
+
+def adjust_count(key, delta):
+    """Изменяет закэшированный счетчик, если он уже посчитан."""
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        pass
+
+
+def page_window(number, total_pages, size):
+    """Номера страниц в окрестности текущей, не более 2 * size + 1."""
+    first = max(1, number - size)
+    last = min(total_pages, number + size)
+    return range(first, last + 1)
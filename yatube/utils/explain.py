@@ -0,0 +1,34 @@
+"""
+Планы запросов для тестов и замеров.
+
+SQLite отвечает на EXPLAIN QUERY PLAN строками вида «SEARCH posts_post
+USING INDEX …» и «USE TEMP B-TREE FOR ORDER BY», PostgreSQL — узлами
+плана; по ним видно, идет ли запрос по индексу или сортирует строки.
+"""
+from django.db import connections
+
+
+def explain(sql, params=(), using='default'):
+    """Строки плана запроса; пустой список для прочих СУБД."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        prefix, column = 'EXPLAIN QUERY PLAN ', -1
+    elif connection.vendor == 'postgresql':
+        prefix, column = 'EXPLAIN ', 0
+    else:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return [row[column] for row in cursor.fetchall()]
+
+
+def sorts(plan, using='default'):
+    """Шаги плана, на которых строки сортируются, а не читаются по порядку."""
+    vendor = connections[using].vendor
+    if vendor == 'sqlite':
+        return [step for step in plan if 'USE TEMP B-TREE FOR' in step]
+    if vendor == 'postgresql':
+        return [step for step in plan
+                if step.strip().lstrip('-> ').startswith(('Sort',
+                                                          'Incremental'))]
+    return []
@@ -1,9 +1,305 @@
+import base64
+import datetime
+import json
+from math import ceil
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .counting import cached_count, page_window
+
+# Порядок ленты совпадает с Post.Meta.ordering и индексом по pub_date,
+# id добавлен для однозначности при одинаковой дате публикации.
+DEFAULT_ORDERING = ('-pub_date', '-id')
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _resolve_field(model, path):
+    """Возвращает поле модели по пути вида `author__username`."""
+    *relations, name = path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    if name == 'pk':
+        return model._meta.pk
+    return model._meta.get_field(name)
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """Сохраняет микросекунды: без них курсор по дате неточен."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _get_value(row, path):
+    """Достает значение ключа из объекта модели или словаря values()."""
+    if isinstance(row, dict):
+        return row[path]
+    for attr in path.split('__'):
+        row = getattr(row, attr)
+    return row
+
+
+class KeysetPaginator(Paginator):
+    """
+    Паджинатор по ключу (pub_date, id) вместо LIMIT/OFFSET.
+
+    Обслуживает одну страницу: запрос выбирает per_page + 1 строк
+    после (или до) курсора, поэтому стоимость не зависит от глубины.
+    Номер страницы передается внутри курсора, чтобы шаблоны могли
+    по-прежнему пользоваться page_obj.number.
+    """
+
+    def __init__(self, object_list, per_page, ordering=DEFAULT_ORDERING,
+                 count_key=None, count=None, **kwargs):
+        self.ordering = tuple(ordering)
+        self.count_key = count_key
+        if count is not None:
+            # Число строк уже известно, например из счетчиков.
+            self.__dict__['count'] = count
+        self.keys = [key.lstrip('-') for key in self.ordering]
+        self.descending = [key.startswith('-') for key in self.ordering]
+        super().__init__(object_list.order_by(*self.ordering),
+                         per_page, **kwargs)
+        self.number = 1
+        self.direction = FORWARD
+        self.values = None
+        self.offset = 0
+        self.page_obj = None
+
+    def encode_cursor(self, number, direction, row):
+        # Без строки — курсор от конца ленты (ссылка «Последняя»).
+        values = None if row is None else [_get_value(row, key)
+                                           for key in self.keys]
+        data = json.dumps([number, direction, values], cls=_CursorEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padding = '=' * (-len(token) % 4)
+            data = json.loads(base64.urlsafe_b64decode(token + padding))
+            number, direction, values = data
+            if values is not None:
+                values = [self._key_field(key).to_python(value)
+                          for key, value in zip(self.keys, values)]
+        except (TypeError, ValueError, LookupError, AttributeError):
+            raise InvalidCursor(token)
+        if (not isinstance(number, int) or number < 1
+                or direction not in (FORWARD, BACKWARD)):
+            raise InvalidCursor(token)
+        if values is None:
+            if direction != BACKWARD:
+                raise InvalidCursor(token)
+        elif len(values) != len(self.keys):
+            raise InvalidCursor(token)
+        return number, direction, values
+
+    def _key_field(self, key):
+        """Поле ключа: из модели или из аннотации, например ранга."""
+        annotation = self.object_list.query.annotations.get(key)
+        if annotation is not None:
+            return annotation.output_field
+        return _resolve_field(self.object_list.model, key)
+
+    def _seek_filter(self, values, forward):
+        """Строит условие «строго после/до ключа» в порядке ленты."""
+        condition = Q()
+        for position, key in enumerate(self.keys):
+            greater = self.descending[position] != forward
+            lookup = f'{key}__{"gt" if greater else "lt"}'
+            step = Q(**{lookup: values[position]})
+            for previous in range(position):
+                step &= Q(**{self.keys[previous]: values[previous]})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [key[1:] if key.startswith('-') else f'-{key}'
+                for key in self.ordering]
+
+    @cached_property
+    def window(self):
+        """Строки текущей страницы и признак наличия строк за ней."""
+        limit = self.per_page + 1
+        queryset = self.object_list
+        if self.values is None and self.direction == BACKWARD:
+            # Последняя страница читается с конца ленты, а не через
+            # OFFSET; в ней столько строк, сколько осталось по счетчику.
+            size = self.count % self.per_page or self.per_page
+            rows = list(queryset.order_by(*self._reversed_ordering())[:size])
+            rows.reverse()
+            return rows, False
+        if self.values is None:
+            rows = list(queryset[self.offset:self.offset + limit])
+        elif self.direction == FORWARD:
+            rows = list(queryset.filter(
+                self._seek_filter(self.values, forward=True)
+            )[:limit])
+        else:
+            rows = list(queryset.filter(
+                self._seek_filter(self.values, forward=False)
+            ).order_by(*self._reversed_ordering())[:limit])
+            rows.reverse()
+            if len(rows) < limit:
+                # Дошли до начала ленты: это первая страница,
+                # даже если за время просмотра появились новые записи.
+                self._reset(1)
+                return self.window
+            return rows[1:], True
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    @property
+    def rows(self):
+        return self.window[0]
+
+    @property
+    def has_more(self):
+        return self.window[1]
+
+    @property
+    def num_pages(self):
+        # Без COUNT: известна только текущая страница и есть ли следующая.
+        return self.number + 1 if self.has_more else self.number
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.count_key)
+
+    @cached_property
+    def total_pages(self):
+        """Полное число страниц: требует подсчета строк."""
+        if not self.count:
+            return 1
+        return ceil(self.count / self.per_page)
+
+    @property
+    def page_range(self):
+        return range(1, self.total_pages + 1)
+
+    @property
+    def page_window(self):
+        """Ограниченная окрестность номеров для шаблона паджинатора."""
+        return page_window(self.number, max(self.total_pages, self.num_pages),
+                           settings.PAGINATOR_WINDOW)
+
+    @property
+    def next_cursor(self):
+        if not self.has_more:
+            return None
+        return self.encode_cursor(self.number + 1, FORWARD, self.rows[-1])
+
+    @property
+    def previous_cursor(self):
+        if self.number <= 1 or not self.rows:
+            return None
+        return self.encode_cursor(self.number - 1, BACKWARD, self.rows[0])
+
+    @property
+    def last_cursor(self):
+        if not self.has_more:
+            return None
+        return self.encode_cursor(max(self.total_pages, self.number + 1),
+                                  BACKWARD, None)
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            return 1
+        return max(number, 1)
+
+    def _reset(self, number):
+        self.number = self.validate_number(number)
+        self.direction = FORWARD
+        self.values = None
+        self.offset = (self.number - 1) * self.per_page
+        self.__dict__.pop('window', None)
+        if self.page_obj is not None:
+            self.page_obj.number = self.number
+
+    def _make_page(self):
+        self.page_obj = Page(_LazyRows(self), self.number, self)
+        return self.page_obj
+
+    def page(self, number):
+        """Страница по номеру (совместимость со ссылками вида ?page=N)."""
+        self.page_obj = None
+        self._reset(number)
+        return self._make_page()
+
+    def get_page(self, number):
+        page = self.page(number)
+        if self.number > 1 and not self.rows:
+            # Как и Paginator.get_page: номер за концом — последняя страница.
+            self._seek_end()
+        return page
+
+    def _seek_end(self):
+        self._reset(max(self.total_pages, 1))
+        self.direction = BACKWARD
+
+    def cursor_page(self, token):
+        """Страница по непрозрачному курсору next/prev."""
+        try:
+            number, direction, values = self.decode_cursor(token)
+        except InvalidCursor:
+            return self.page(1)
+        self.page(number)
+        self.direction = direction
+        self.values = values
+        return self.page_obj
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Паджинатор по номерам страниц с числом строк из cached_count.
+
+    Для админки: большие таблицы без фильтров считаются по статистике
+    планировщика, отфильтрованные выборки — одним COUNT на время
+    COUNT_CACHE_TIMEOUT, поэтому число страниц может немного отставать.
+    """
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+
+class _LazyRows:
+    """Откладывает запрос страницы до первого обращения к записям."""
+
+    def __init__(self, paginator):
+        self.paginator = paginator
+
+    def __iter__(self):
+        return iter(self.paginator.rows)
+
+    def __len__(self):
+        return len(self.paginator.rows)
+
+    def __getitem__(self, index):
+        return self.paginator.rows[index]
 
 
-def get_paginator(request, obj):
-    paginator = Paginator(obj, settings.POSTS_ON_PAGE)
+def get_paginator(request, obj, ordering=DEFAULT_ORDERING, count_key=None,
+                  count=None, per_page=None):
+    paginator = KeysetPaginator(obj, per_page or settings.POSTS_ON_PAGE,
+                                ordering, count_key, count)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.cursor_page(cursor)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
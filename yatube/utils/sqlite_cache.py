@@ -0,0 +1,187 @@
+"""
+Кэш в файле SQLite, общий для всех процессов одного сервера.
+
+LocMemCache у каждого воркера свой, поэтому сброс версии в одном
+воркере не доходит до остальных. Этот бэкенд хранит записи в одном
+файле в режиме WAL: читатели не блокируют писателя, а внешние
+сервисы не нужны.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'utils.sqlite_cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+        }
+    }
+"""
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        options = params.get('OPTIONS', {})
+        self.busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self.cull_every = options.get('CULL_EVERY', 100)
+        self._local = threading.local()
+        self._sets = 0
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.location,
+                                         timeout=self.busy_timeout,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+        return connection
+
+    def _fetch(self, keys):
+        now = time.time()
+        placeholders = ','.join('?' * len(keys))
+        rows = self.connection.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders})'
+            ' AND (expires IS NULL OR expires > ?)',
+            [*keys, now]
+        )
+        return {key: pickle.loads(value) for key, value in rows}
+
+    def _write(self, key, value, timeout, replace=True):
+        verb = 'REPLACE' if replace else 'IGNORE'
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        cursor = self.connection.execute(
+            f'INSERT OR {verb} INTO cache (key, value, expires)'
+            ' VALUES (?, ?, ?)',
+            [key, data, self.get_backend_timeout(timeout)]
+        )
+        return cursor.rowcount > 0
+
+    def _maybe_cull(self):
+        self._sets += 1
+        if self._sets % self.cull_every:
+            return
+        connection = self.connection
+        connection.execute('DELETE FROM cache WHERE expires <= ?',
+                           [time.time()])
+        (total,) = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if total > self._max_entries:
+            # Как у прочих бэкендов Django: удаляем 1/cull_frequency
+            # записей, в первую очередь ближайшие к истечению.
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache'
+                ' ORDER BY expires IS NULL, expires LIMIT ?)',
+                [total // self._cull_frequency or 1]
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys_map = {self.make_key(key, version=version): key for key in keys}
+        for key in keys_map:
+            self.validate_key(key)
+        if not keys_map:
+            return {}
+        return {keys_map[key]: value
+                for key, value in self._fetch(list(keys_map)).items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(key, value, timeout)
+        self._maybe_cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            for key, value in data.items():
+                key = self.make_key(key, version=version)
+                self.validate_key(key)
+                self._write(key, value, timeout)
+        self._maybe_cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                [key, time.time()]
+            )
+            added = self._write(key, value, timeout, replace=False)
+        if added:
+            self._maybe_cull()
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self.connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)',
+            [self.get_backend_timeout(timeout), key, time.time()]
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            value = self._fetch([key]).get(key)
+            if value is None:
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            self.connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                [pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key]
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key in self._fetch([key])
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.connection.execute('DELETE FROM cache WHERE key = ?', [key])
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.executemany('DELETE FROM cache WHERE key = ?',
+                                        [[key] for key in keys])
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живет весь поток: файл открыт постоянно,
+        # переподключение на каждый запрос обошлось бы дороже.
+        pass
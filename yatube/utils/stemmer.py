@@ -0,0 +1,136 @@
+"""
+Стеммер русского языка по алгоритму Snowball (Porter).
+
+Отрезает окончания и суффиксы, чтобы разные формы слова
+(«котами», «кота», «кот») давали одну основу. Слова не
+на кириллице возвращаются как есть, в нижнем регистре.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+# Окончания первой группы допустимы только после «а» или «я».
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+ADJECTIVE = ((), (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+     'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = ((), (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+))
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+CYRILLIC = re.compile('[а-я]')
+WORD = re.compile(r'\w+')
+
+
+def _regions(word):
+    """Начала областей RV и R2 по правилам Snowball."""
+    rv = r1 = r2 = len(word)
+    for position, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = position + 1
+            break
+    for position in range(1, len(word)):
+        if word[position - 1] in VOWELS and word[position] not in VOWELS:
+            r1 = position + 1
+            break
+    for position in range(r1 + 1, len(word)):
+        if word[position - 1] in VOWELS and word[position] not in VOWELS:
+            r2 = position + 1
+            break
+    return rv, r2
+
+
+def _strip(word, rv, groups):
+    """
+    Отрезает самое длинное окончание из групп внутри RV.
+
+    Возвращает слово без окончания или None, если ничего не нашлось.
+    """
+    after_a, plain = groups
+    endings = [(ending, True) for ending in after_a]
+    endings += [(ending, False) for ending in plain]
+    endings.sort(key=lambda item: len(item[0]), reverse=True)
+    for ending, needs_a in endings:
+        start = len(word) - len(ending)
+        if start < rv or not word.endswith(ending):
+            continue
+        if needs_a and (start - 1 < rv or word[start - 1] not in 'ая'):
+            continue
+        return word[:start]
+    return None
+
+
+def _strip_adjectival(word, rv):
+    stripped = _strip(word, rv, ADJECTIVE)
+    if stripped is None:
+        return None
+    return _strip(stripped, rv, PARTICIPLE) or stripped
+
+
+def _strip_inflection(word, rv):
+    """Шаг 1: деепричастие или возвратность и окончание."""
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    word = _strip(word, rv, REFLEXIVE) or word
+    stripped = _strip_adjectival(word, rv)
+    for groups in (VERB, NOUN):
+        if stripped is not None:
+            break
+        stripped = _strip(word, rv, groups)
+    return word if stripped is None else stripped
+
+
+def _strip_suffixes(word, rv, r2):
+    """Шаги 2–4: «и», словообразовательный суффикс, превосходная степень."""
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    for ending in DERIVATIONAL:
+        if word.endswith(ending) and len(word) - len(ending) >= r2:
+            word = word[:-len(ending)]
+            break
+    for ending in SUPERLATIVE:
+        if word.endswith(ending) and len(word) - len(ending) >= rv:
+            word = word[:-len(ending)]
+            break
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+def stem(word):
+    """Основа слова в нижнем регистре."""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC.search(word):
+        return word
+    rv, r2 = _regions(word)
+    return _strip_suffixes(_strip_inflection(word, rv), rv, r2)
+
+
+def stems(text):
+    """Основы всех слов текста по порядку."""
+    return [stem(word) for word in WORD.findall(text)]
@@ -0,0 +1,76 @@
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from utils.cache import get_or_compute
+
+register = template.Library()
+
+
+class FragmentCacheNode(CacheNode):
+    """
+    Как {% cache %}, но пересчет фрагмента защищен от лавины.
+
+    Для запроса, закрепленного за основной базой (request.db_pinned),
+    фрагмент рендерится заново и заменяет закэшированный: тот мог быть
+    собран по отстающей реплике без только что сделанной записи.
+    """
+
+    def render(self, context):
+        try:
+            expire_time = self.expire_time_var.resolve(context)
+            if expire_time is not None:
+                expire_time = int(expire_time)
+        except (template.VariableDoesNotExist, ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                '"fragment_cache" tag got an invalid timeout: '
+                f'{self.expire_time_var.var!r}'
+            )
+        try:
+            if self.cache_name:
+                backend = caches[self.cache_name.resolve(context)]
+            else:
+                backend = caches['template_fragments']
+        except InvalidCacheBackendError:
+            if self.cache_name:
+                raise template.TemplateSyntaxError(
+                    'Invalid cache name specified for cache tag: '
+                    f'{self.cache_name.var!r}'
+                )
+            backend = caches['default']
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        request = context.get('request')
+        return get_or_compute(key,
+                              lambda: self.nodelist.render(context),
+                              expire_time,
+                              backend=backend,
+                              refresh=getattr(request, 'db_pinned', False))
+
+
+@register.tag('fragment_cache')
+def do_fragment_cache(parser, token):
+    """
+    {% fragment_cache timeout name [vary_on ...] [using="cache"] %}
+
+    Аргументы те же, что у встроенного {% cache %}.
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 2 arguments."
+        )
+    cache_name = None
+    if len(tokens) > 3 and tokens[-1].startswith('using='):
+        cache_name = parser.compile_filter(tokens[-1][len('using='):])
+        tokens = tokens[:-1]
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        cache_name,
+    )
@@ -0,0 +1,21 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def query_replace(context, **params):
+    """
+    Строка запроса текущей страницы с замененными параметрами.
+
+    Номер страницы и курсор взаимоисключающие: задав один,
+    второй из строки убираем.
+    """
+    query = context['request'].GET.copy()
+    if 'page' in params:
+        query.pop('cursor', None)
+    if 'cursor' in params:
+        query.pop('page', None)
+    for name, value in params.items():
+        query[name] = value
+    return f'?{query.urlencode()}'
@@ -11,11 +11,16 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
+# запуск тестов: manage.py test или pytest
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 
@@ -54,6 +59,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryCountMiddleware',
+    'core.middleware.TemplateProfileMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -66,12 +74,24 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
+# Шаблоны компилируются один раз на процесс, даже с DEBUG;
+# YATUBE_TEMPLATE_RELOAD=1 — перечитывать их на каждый запрос
+# при правке шаблонов.
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if os.environ.get('YATUBE_TEMPLATE_RELOAD') != '1':
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -83,19 +103,66 @@ TEMPLATES = [
     },
 ]
 
+# Панель отладки ищет свои шаблоны через APP_DIRS; при явных loaders
+# их находит app_directories.Loader, так что предупреждение лишнее.
+SILENCED_SYSTEM_CHECKS = ['debug_toolbar.W006']
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# База задается окружением, по умолчанию — SQLite рядом с проектом.
+# YATUBE_DB_CONN_MAX_AGE — сколько секунд соединение живет между
+# запросами; 0 — новое соединение на каждый запрос.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ENGINE': os.environ.get('YATUBE_DB_ENGINE',
+                                 'django.db.backends.sqlite3'),
+        'NAME': os.environ.get('YATUBE_DB_NAME',
+                               os.path.join(BASE_DIR, 'db.sqlite3')),
+        'USER': os.environ.get('YATUBE_DB_USER', ''),
+        'PASSWORD': os.environ.get('YATUBE_DB_PASSWORD', ''),
+        'HOST': os.environ.get('YATUBE_DB_HOST', ''),
+        'PORT': os.environ.get('YATUBE_DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_DB_CONN_MAX_AGE', 60)),
     }
 }
 
+# реплика для чтения: те же параметры, кроме заданных окружением;
+# представления с read_from_replica читают с нее
+DATABASE_REPLICA = None
+if os.environ.get('YATUBE_DB_REPLICA_HOST') or os.environ.get(
+        'YATUBE_DB_REPLICA_NAME'):
+    DATABASE_REPLICA = 'replica'
+    DATABASES[DATABASE_REPLICA] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('YATUBE_DB_REPLICA_NAME',
+                               DATABASES['default']['NAME']),
+        'HOST': os.environ.get('YATUBE_DB_REPLICA_HOST',
+                               DATABASES['default']['HOST']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+# после записи пользователь столько секунд читает с основной базы:
+# больше обычного отставания реплики
+DB_PIN_COOKIE = 'yatube_primary'
+DB_PIN_SECONDS: int = 10
+
+# постоянное соединение, простоявшее дольше этого, проверяется
+# в начале запроса и при обрыве открывается заново, секунды
+DB_HEALTH_CHECK_INTERVAL: int = 30
+
+# настройки каждого соединения SQLite: WAL позволяет читать во время
+# записи, synchronous=NORMAL в режиме WAL не теряет целостности
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -137,7 +204,59 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# collectstatic складывает сюда файлы с хэшем в имени, минифицированный
+# CSS и сжатые копии .gz/.br (brotli — если установлен пакет brotli)
+STATIC_ROOT = os.environ.get('YATUBE_STATIC_ROOT',
+                             os.path.join(BASE_DIR, 'staticfiles'))
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+STATIC_COMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.ico', '.txt',
+                              '.json', '.xml', '.map')
+# YATUBE_SERVE_STATIC=1 — статику из STATIC_ROOT отдает само
+# WSGI-приложение (core.static), без отдельного веб-сервера
+STATIC_SERVE = os.environ.get('YATUBE_SERVE_STATIC') == '1'
+# срок кэширования файлов без хэша в имени, секунды
+STATIC_MAX_AGE: int = 60
+
 POSTS_ON_PAGE: int = 10
+# сколько соседних страниц показывать в паджинаторе с каждой стороны
+PAGINATOR_WINDOW: int = 3
+# время жизни закэшированных счетчиков записей, секунды
+COUNT_CACHE_TIMEOUT: int = 60 * 15
+# начиная с какого размера таблицы COUNT заменяется оценкой планировщика
+COUNT_ESTIMATE_THRESHOLD: int = 100_000
+
+# записи авторов с таким числом подписчиков не раздаются по лентам,
+# а добавляются при чтении; 0 отключает гибридный режим
+TIMELINE_FANOUT_THRESHOLD: int = 1000
+TIMELINE_CELEBRITIES_TIMEOUT: int = 60 * 5
+TIMELINE_BATCH_SIZE: int = 1000
+# потоки для отложенных заданий ленты; 0 — выполнять сразу после фиксации
+TIMELINE_WORKERS: int = 1
+
+# списки записей инвалидируются по версиям, время жизни — страховка
+POST_LIST_CACHE_TIMEOUT: int = 60 * 5
+# карточки постов: ключ меняется вместе с содержимым карточки,
+# поэтому срок большой
+POST_CARD_CACHE_TIMEOUT: int = 60 * 60 * 24
+
+COMMENTS_ON_PAGE: int = 20
+
+# полнотекстовый поиск; без YATUBE_SEARCH_BACKEND бэкенд выбирается
+# по СУБД: индекс FTS5 в SQLite, для других баз — поиск подстрок
+# без индекса (posts.search.SearchBackend)
+SEARCH_BACKEND = os.environ.get('YATUBE_SEARCH_BACKEND')
+SEARCH_MAX_TERMS: int = 10
+SEARCH_REBUILD_BATCH_SIZE: int = 500
+
+AUTHORS_ON_PAGE: int = 20
+AUTHORS_CACHE_TIMEOUT: int = 60
+
+# размер страницы JSON API по умолчанию и наибольший для ?limit
+API_PAGE_SIZE: int = 20
+API_MAX_PAGE_SIZE: int = 100
+
+# столько строк выгрузка читает из базы за раз
+EXPORT_CHUNK_SIZE: int = 2000
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -153,12 +272,90 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# загрузка картинок постов: файл пишется на диск частями,
+# лимиты проверяются по ходу чтения и по заголовку картинки
+FILE_UPLOAD_HANDLERS = ['posts.uploads.BoundedUploadHandler']
+POST_IMAGE_MAX_BYTES: int = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS: int = 40_000_000
+# большие картинки уменьшаются до этой стороны в фоне
+POST_IMAGE_MAX_SIDE: int = 2560
+
+# миниатюры картинок готовятся в фоне при сохранении поста;
+# 0 потоков — сразу, в процессе обработки запроса
+THUMBNAIL_BACKEND = 'posts.thumbnails.AsyncThumbnailBackend'
+THUMBNAIL_WORKERS: int = 2
+# сколько после отправки ответа ждать миниатюры, заказанные запросом;
+# 0 — не ждать, воркер сразу свободен; тесты ждут, чтобы их временный
+# MEDIA_ROOT не удалялся, пока в него пишут потоки
+THUMBNAIL_WAIT_TIMEOUT: int = 30 if TESTING else 0
+# через сколько секунд перепроверить варианты, которые готовятся
+# или не получились: по файлу в хранилище
+THUMBNAIL_STATE_TIMEOUT: int = 60 * 10
+# соответствия картинок и миниатюр: LRU в памяти перед индексом SQLite;
+# индекс лежит рядом с базой, а не в раздаваемом MEDIA_ROOT
+THUMBNAIL_KVSTORE = 'posts.thumbnails.IndexKVStore'
+THUMBNAIL_INDEX = os.environ.get('YATUBE_THUMBNAIL_INDEX',
+                                 os.path.join(BASE_DIR, 'thumbnails.sqlite3'))
+THUMBNAIL_INDEX_LRU_SIZE: int = 10_000
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# общий для всех воркеров кэш в файле SQLite: путь задается окружением
+if os.environ.get('YATUBE_CACHE_LOCATION'):
+    CACHES['default'] = {
+        'BACKEND': 'utils.sqlite_cache.SQLiteCache',
+        'LOCATION': os.environ['YATUBE_CACHE_LOCATION'],
+        'OPTIONS': {
+            'MAX_ENTRIES': 100_000,
+        },
+    }
+
+# ETag и ответы 304 страниц записей строятся из версий в кэше: с кэшем
+# в памяти процесса запись в одном воркере не меняет версии в других
+CONDITIONAL_PAGES = (CACHES['default']['BACKEND']
+                     != 'django.core.cache.backends.locmem.LocMemCache')
+
+# пересчет кэша заранее: чем больше beta, тем раньше (алгоритм XFetch)
+CACHE_EARLY_RECOMPUTE_BETA: float = 1.0
+# сколько держится блокировка пересчета и как часто ее проверяют
+CACHE_LOCK_TIMEOUT: int = 10
+CACHE_LOCK_POLL: float = 0.05
+
+# число запросов к базе за HTTP-запрос, после которого пишется предупреждение
+QUERY_COUNT_WARNING: int = 20
+# сколько раз запрос должен повториться за HTTP-запрос, чтобы считаться N+1
+QUERY_DUPLICATE_THRESHOLD: int = 3
+# YATUBE_TEMPLATE_PROFILE=1 — писать в лог yatube.templates время
+# рендеринга шаблонов каждого запроса, TEMPLATE_PROFILE_TOP самых дорогих
+TEMPLATE_PROFILE = os.environ.get('YATUBE_TEMPLATE_PROFILE') == '1'
+TEMPLATE_PROFILE_TOP: int = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yatube.queries': {
+            'handlers': ['console'],
+            # в тестах предупреждения о запросах не засоряют вывод
+            'level': os.environ.get('YATUBE_QUERY_LOG_LEVEL',
+                                    'ERROR' if TESTING else 'WARNING'),
+        },
+        'yatube.templates': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]